@@ -1,26 +1,242 @@
-
-import requests
+import logging
 import time
-from urllib.parse import urlencode
+from threading import Lock
+
+# Request priority classes, highest first
+INTERACTIVE = 'interactive'
+INGESTION = 'ingestion'
+BACKFILL = 'backfill'
+PRIORITIES = (INTERACTIVE, INGESTION, BACKFILL)
+
+# How often a waiter that yielded to a higher priority one checks again
+YIELD_INTERVAL = 0.05
+
+# What a waiting request is held up by
+APP = 'app'
+METHOD = 'method'
+BLOCKED = 'blocked'
+
+
+def host_of(method):
+    """
+    The host part of a method key ("<host>:<method>", see
+    riot_api.get_method_key). Riot counts application limits per routing
+    value, so each host gets its own application buckets.
+    """
+    return method.rsplit(':', 1)[0] if method else None
+
+
+def parse_rate_limit_header(value):
+    """Parses a Riot limit header such as '20:1,100:120' into [(20, 1), (100, 120)]."""
+    limits = []
+    for part in (value or '').split(','):
+        if ':' not in part:
+            continue
+        amount, period = part.split(':', 1)
+        try:
+            limits.append((int(amount), int(period)))
+        except ValueError:
+            continue
+    return limits
+
+
+class TokenBucket:
+    """
+    Token bucket for one Riot limit, e.g. 100 requests per 120 seconds.
+
+    Riot counts requests in fixed windows that start with the first request,
+    so instead of refilling continuously (which could let through twice the
+    limit inside one window) the bucket refills completely when its window
+    ends. Every check is O(1).
+
+    Each priority class can reserve a share of the capacity. Ingestion and
+    backfill requests must leave the unused part of every other class's
+    reservation alone; interactive requests may borrow all of it, since a
+    user is waiting on them.
+    """
+
+    def __init__(self, capacity, period, reserved_shares=None):
+        self.capacity = capacity
+        self.period = period
+        self.reserved_shares = reserved_shares or {}
+        # Start our window a little late so it never ends before Riot's does
+        self.margin = min(1.0, period * 0.05)
+        self.used = 0
+        self.used_by = {}
+        self.window_start = None
+
+    def _roll(self, now):
+        if self.window_start is not None and now >= self.window_start + self.period + self.margin:
+            self.window_start = None
+            self.used = 0
+            self.used_by = {}
+
+    def _held_for_others(self, priority):
+        """Requests other classes have reserved in this window but not made yet."""
+        if priority == INTERACTIVE:
+            return 0
+        return sum(
+            max(0, int(self.capacity * share) - self.used_by.get(other, 0))
+            for other, share in self.reserved_shares.items() if other != priority
+        )
+
+    def time_until_available(self, now, priority=None):
+        self._roll(now)
+        if self.used + self._held_for_others(priority) < self.capacity or self.window_start is None:
+            return 0.0
+        return self.window_start + self.period + self.margin - now
+
+    def consume(self, now, priority=None):
+        self._roll(now)
+        if self.window_start is None:
+            self.window_start = now
+        self.used += 1
+        self.used_by[priority] = self.used_by.get(priority, 0) + 1
+
+    def sync(self, used, now):
+        """Adopts Riot's count for the current window if it is ahead of ours."""
+        self._roll(now)
+        if used > self.used:
+            if self.window_start is None:
+                self.window_start = now
+            self.used = used
+
 
 class RateLimiter:
-    def __init__(self, max_requests, period):
-        self.max_requests = max_requests  # Maximum requests allowed
-        self.period = period  # Time period in seconds
-        self.requests = []
-    
-    def wait(self):
-        current_time = time.time()
-        # Remove requests that are outside the period
-        self.requests = [req_time for req_time in self.requests if req_time > current_time - self.period]
-        if len(self.requests) >= self.max_requests:
-            # Calculate the time to wait
-            sleep_time = self.period - (current_time - self.requests[0])
-            print(f"Rate limit reached. Sleeping for {sleep_time:.2f} seconds.")
-            time.sleep(sleep_time)
-            # After sleeping, remove the oldest request
-            self.requests.pop(0)
-        # Record the new request
-        self.requests.append(time.time())
-
-    
\ No newline at end of file
+    """
+    Greenlet/thread-safe limiter for the Riot API.
+
+    Keeps one set of buckets for the application limit per host (europe and
+    eun1 are counted separately) and one per API method, since every
+    endpoint has its own cap. Both are re-synchronized from the
+    X-App-Rate-Limit / X-Method-Rate-Limit headers (and their *-Count
+    counterparts) on every response, so a freshly restarted process picks up
+    the budget already spent instead of running into 429s.
+
+    Every request carries a priority (INTERACTIVE, INGESTION or BACKFILL).
+    Besides the reserved shares enforced by the buckets, a waiting request
+    yields to a waiting request of higher priority that needs the same
+    capacity, so a search never queues behind a leaderboard refresh that is
+    sleeping off a limit. Waiters short on a host's application limit outrank
+    every lower request to that host; waiters short on a method's limit only
+    outrank lower requests to that method, and waiters sitting out a 429
+    outrank nobody until their Retry-After is over.
+    """
+
+    def __init__(self, app_limits, reserved_shares=None):
+        self.reserved_shares = dict(reserved_shares or {})
+        unknown = set(self.reserved_shares) - set(PRIORITIES)
+        if unknown:
+            raise ValueError(f"Unknown priority classes: {', '.join(sorted(unknown))}")
+        if sum(self.reserved_shares.values()) >= 1:
+            raise ValueError("Reserved shares must add up to less than 1")
+        self._lock = Lock()
+        self.app_limits = app_limits  # Until a host's own headers say otherwise
+        self.app_buckets = {}  # Host -> buckets
+        self.method_buckets = {}
+        self.blocked_until = {}  # Host (whole app) or method -> monotonic deadline
+        self.waiters = {}  # Waiting call -> (priority, method, what it waits for: APP, METHOD or BLOCKED)
+        self.slept_seconds = 0.0
+
+    def _build_buckets(self, limits, previous=None):
+        previous = {bucket.period: bucket for bucket in (previous or [])}
+        buckets = []
+        for capacity, period in limits:
+            bucket = previous.get(period) or TokenBucket(capacity, period, self.reserved_shares)
+            bucket.capacity = capacity
+            buckets.append(bucket)
+        return buckets
+
+    def _app_buckets(self, host):
+        if host not in self.app_buckets:
+            self.app_buckets[host] = self._build_buckets(self.app_limits)
+        return self.app_buckets[host]
+
+    def _wait_time(self, method, priority, now):
+        """
+        Returns how long the request has to wait, what holds it up longest
+        (APP, METHOD or BLOCKED) and the buckets it will draw from.
+        """
+        app_buckets = self._app_buckets(host_of(method))
+        method_buckets = self.method_buckets.get(method, [])
+        waits = {
+            APP: max([0.0] + [bucket.time_until_available(now, priority) for bucket in app_buckets]),
+            METHOD: max([0.0] + [bucket.time_until_available(now, priority) for bucket in method_buckets]),
+            BLOCKED: max([0.0] + [deadline - now for key, deadline in self.blocked_until.items()
+                                  if key in (host_of(method), method)])
+        }
+        reason = max(waits, key=waits.get)
+        return waits[reason], reason, app_buckets + method_buckets
+
+    def _outranked(self, priority, method):
+        """True while a higher priority request is waiting for capacity this one would use."""
+        rank = PRIORITIES.index(priority)
+        for other_priority, other_method, reason in self.waiters.values():
+            if PRIORITIES.index(other_priority) >= rank:
+                continue
+            if (reason == APP and host_of(other_method) == host_of(method)) or \
+                    (reason == METHOD and other_method == method):
+                return True
+        return False
+
+    def wait(self, method=None, priority=INGESTION):
+        """
+        Blocks until a request to the given method fits every limit, then
+        reserves it. Returns the seconds spent sleeping.
+        """
+        slept = 0.0
+        ticket = object()
+        try:
+            while True:
+                with self._lock:
+                    now = time.monotonic()
+                    sleep_time, reason, buckets = self._wait_time(method, priority, now)
+                    outranked = self._outranked(priority, method)
+                    if sleep_time <= 0 and not outranked:
+                        for bucket in buckets:
+                            bucket.consume(now, priority)
+                        return slept
+                    # A waiter that is only yielding holds up nobody itself
+                    self.waiters[ticket] = (priority, method, reason if sleep_time > 0 else None)
+                if sleep_time <= 0:
+                    # Only yielding to a higher priority request; check back soon
+                    sleep_time = YIELD_INTERVAL
+                else:
+                    logging.info(f"Rate limit reached for {method or 'app'} ({priority}). "
+                                 f"Sleeping for {sleep_time:.2f} seconds.")
+                time.sleep(sleep_time)
+                self.slept_seconds += sleep_time
+                slept += sleep_time
+        finally:
+            with self._lock:
+                self.waiters.pop(ticket, None)
+
+    def update_from_headers(self, method, headers):
+        """Resynchronizes limits and counts from a Riot response's headers."""
+        with self._lock:
+            now = time.monotonic()
+            host = host_of(method)
+            app_limits = parse_rate_limit_header(headers.get('X-App-Rate-Limit'))
+            if app_limits:
+                self.app_buckets[host] = self._build_buckets(app_limits, self.app_buckets.get(host))
+            method_limits = parse_rate_limit_header(headers.get('X-Method-Rate-Limit'))
+            if method_limits:
+                self.method_buckets[method] = self._build_buckets(
+                    method_limits, self.method_buckets.get(method))
+
+            self._sync_counts(self._app_buckets(host), headers.get('X-App-Rate-Limit-Count'), now)
+            self._sync_counts(self.method_buckets.get(method, []), headers.get('X-Method-Rate-Limit-Count'), now)
+
+    @staticmethod
+    def _sync_counts(buckets, header_value, now):
+        counts = {period: used for used, period in parse_rate_limit_header(header_value)}
+        for bucket in buckets:
+            if bucket.period in counts:
+                bucket.sync(counts[bucket.period], now)
+
+    def block(self, method, retry_after, limit_type=None):
+        """Pauses requests after a 429: everything sent to the method's host, or just the method."""
+        key = host_of(method) if limit_type in (None, 'application') else method
+        with self._lock:
+            deadline = time.monotonic() + retry_after
+            self.blocked_until[key] = max(self.blocked_until.get(key, 0.0), deadline)
@@ -6,16 +6,21 @@ monkey.patch_all()
 
 import os
 import time
-from threading import Lock
-from flask import Flask, request, jsonify
+import json
+import hashlib
+import hmac
+import sqlite3
+import atexit
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
-from flask_socketio import SocketIO
+from flask_socketio import SocketIO, emit
 from flask_migrate import Migrate  # Import Flask-Migrate
+from gevent.pool import Pool
 import logging
 from datetime import datetime
-from sqlalchemy import func
-from riot_api import assign_roles_by_team_position
+from sqlalchemy import func, and_, or_, select
+from sqlalchemy.orm import aliased, selectinload
 from rank_utils import get_summoner_id_by_puuid
 from rank_utils import fetch_flex_then_solo_rank_numeric
 
@@ -24,12 +29,27 @@ from riot_api import (
     get_summoner_info,
     get_match_ids_by_summoner_puuid,
     get_recent_match_id,
-    get_match_data,
-    get_player_stats_in_match,
-    calculate_scores
+    riot_priority
 )
+from RateLimiter import INTERACTIVE, INGESTION
 import settings
 from database import db
+from riot_cache import MISSING, SingleFlight, match_store, summoner_id_cache, rank_cache, riot_id_cache
+from match_model import load_match
+from match_archive import match_archive
+import metrics
+from leaderboard import (
+    MATCH_WINDOW,
+    LEADERBOARD_SIZE,
+    LEADERBOARD_DELTA_HISTORY,
+    apply_match_inserted,
+    apply_match_evicted,
+    update_window_fields,
+    schedule_next_poll,
+    reconcile_player,
+    leaderboard_row,
+    rank_rows
+)
 
 from dotenv import load_dotenv
 
@@ -51,10 +71,11 @@ socketio = SocketIO(app, cors_allowed_origins=[
     "https://blackultras.com",
     "http://blackultras.com",
     "https://www.blackultras.com"
-], async_mode='gevent')
+], async_mode='gevent', message_queue=settings.Config.SOCKETIO_MESSAGE_QUEUE)
 
 # Import models after initializing db to prevent circular imports
 from models import Player, Match  # Ensure Match model is imported
+from scheduler_lease import Lease
 
 # In-memory queue for players (use a database or persistent storage in production)
 player_queue = []
@@ -84,12 +105,36 @@ PREDEFINED_PLAYERS = [
 # Initialize caching
 from flask_caching import Cache  # Import Flask-Caching
 
-cache = Cache(config={'CACHE_TYPE': 'SimpleCache', 'CACHE_DEFAULT_TIMEOUT': 300})  # Cache timeout set to 5 minutes
+# Cache backend comes from settings (CACHE_TYPE etc.) so all workers share it
+cache = Cache()
 cache.init_app(app)
+# Published snapshots, stored with timeout=0; a threshold of 0 turns off pruning
+snapshot_cache = Cache(config={'CACHE_DIR': settings.Config.SNAPSHOT_CACHE_DIR, 'CACHE_THRESHOLD': 0})
+snapshot_cache.init_app(app)
+
+
+def cache_lookup(entry, key, store=cache):
+    """store.get that records a hit or miss for the given kind of entry in metrics."""
+    value = store.get(key)
+    metrics.cache_requests.inc(entry=entry, result='miss' if value is None else 'hit')
+    return value
+
+
+@metrics.register_collector
+def riot_cache_metrics():
+    caches = {'match_store': match_store, 'summoner_ids': summoner_id_cache, 'ranks': rank_cache, 'riot_ids': riot_id_cache}
+    samples = []
+    for name, store in caches.items():
+        samples.append(({'cache': name, 'result': 'hit'}, store.hits))
+        samples.append(({'cache': name, 'result': 'miss'}, store.misses))
+    return [
+        ('riot_cache_requests_total', 'counter', 'Match store and Riot lookup cache reads by result.', samples),
+        ('search_coalesced_total', 'counter', 'Searches that waited on an identical search already in flight.',
+         [({}, search_flight.shared)])
+    ]
 
-# Initialize the lock and last update time for leaderboard updates
-leaderboard_lock = Lock()
-last_leaderboard_update = 0  # Timestamp of the last update
+# Every process starts the scheduler, but only the holder of this lease ingests
+ingestion_lease = Lease('update_leaderboard', settings.Config.INGESTION_LEASE_TTL)
 
 # Initialize the scheduler
 from apscheduler.schedulers.background import BackgroundScheduler
@@ -98,10 +143,37 @@ scheduler.start()
 
 def update_leaderboard_task():
     with app.app_context():
+        if not ingestion_lease.acquire():
+            logging.info("[LB] Another process holds the ingestion lease; skipping this run.")
+            return
         update_leaderboard()
 
-# Schedule the leaderboard update every 2 minutes
-scheduler.add_job(func=update_leaderboard_task, trigger="interval", minutes=2)
+@atexit.register
+def release_ingestion_lease():
+    # Let another worker take over right away instead of waiting for expiry
+    with app.app_context():
+        ingestion_lease.release()
+
+# Look for players due a poll every POLL_TICK_SECONDS; each has their own schedule
+scheduler.add_job(func=update_leaderboard_task, trigger="interval", seconds=settings.Config.POLL_TICK_SECONDS)
+
+# Merge each finished month of the match archive into one segment; appends
+# only compact the months they write to. Serialized across workers by the
+# archive's lock file, and a no-op once every past month is compacted
+scheduler.add_job(func=match_archive.compact_past_months, trigger="interval", hours=24, next_run_time=datetime.now())
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_duration(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.http_request_duration.observe(
+            time.perf_counter() - started, route=route, method=request.method, status=response.status_code)
+    return response
 
 @app.after_request
 def add_cors_headers(response):
@@ -150,54 +222,83 @@ def manage_queue():
         else:
             return jsonify({'error': 'Player name is required.'}), 400
 
-@app.route('/api/search', methods=['GET'])
-def search_player():
-    """
-    Search for a player and calculate team scores.
-    """
-    summoner_name = request.args.get('summoner_name')
-    summoner_tagline = request.args.get('summoner_tagline')
+search_flight = SingleFlight()
 
-    if not summoner_name or not summoner_tagline:
-        logging.warning("Summoner name or tagline missing in the request.")
-        return jsonify({'error': 'Summoner name and tagline are required.'}), 400
-
-    logging.info(f"Searching for summoner: {summoner_name}#{summoner_tagline}")
+def resolve_puuid(summoner_name, summoner_tagline):
+    """Returns the PUUID behind a Riot ID, asking Riot only when it isn't cached."""
+    riot_id = f"{summoner_name}#{summoner_tagline}".lower()
+    puuid = riot_id_cache.get(riot_id)
+    if puuid is not MISSING:
+        return puuid
 
-    # Fetch player PUUID
     player_info = get_summoner_info(summoner_name, summoner_tagline, region=settings.Config.DEFAULT_REGION)
-    if not player_info:
-        logging.error(f"Player {summoner_name}#{summoner_tagline} not found.")
-        return jsonify({'error': 'Player not found.'}), 404
+    puuid = player_info.get('puuid') if player_info else None
+    if puuid:
+        # Failures aren't cached, a typo'd name may exist by the next search
+        riot_id_cache.set(riot_id, puuid)
+    return puuid
 
-    puuid = player_info.get('puuid')
+def search_latest_match(summoner_name, summoner_tagline):
+    """
+    Scores the team of the player's most recent match, sorted lowest first.
+    Returns {'scores': [...]} or {'error': message}. Results are reused for
+    SEARCH_RESULT_TTL seconds, so repeat searches skip Riot entirely.
+    """
+    puuid = resolve_puuid(summoner_name, summoner_tagline)
     if not puuid:
-        logging.error(f"PUUID not found for player {summoner_name}#{summoner_tagline}.")
-        return jsonify({'error': 'PUUID not found for the player.'}), 404
+        logging.error(f"Player {summoner_name}#{summoner_tagline} not found.")
+        return {'error': 'Player not found.'}
+
+    cache_key = f"search_{puuid}"
+    result = cache_lookup('search', cache_key)
+    if result is not None:
+        return result
 
     # Fetch recent match ID
     match_id = get_recent_match_id(puuid, region=settings.Config.DEFAULT_REGION)
     if not match_id:
         logging.error(f"No recent matches found for PUUID: {puuid}.")
-        return jsonify({'error': 'No recent matches found.'}), 404
-
+        return {'error': 'No recent matches found.'}
 
     # Fetch team members
-    match_data = get_match_data(match_id, region=settings.Config.DEFAULT_REGION)
-    if not match_data:
+    parsed = load_match(match_id, region=settings.Config.DEFAULT_REGION)
+    if not parsed:
         logging.error(f"Unable to retrieve match data for match ID: {match_id}.")
-        return jsonify({'error': 'Unable to retrieve match data.'}), 404
+        return {'error': 'Unable to retrieve match data.'}
 
-    team_members = get_player_stats_in_match(puuid, match_data, team_only=True)
-    if not team_members:
+    # Calculate scores
+    scores = parsed.team_metrics(puuid)
+    if not scores:
         logging.error(f"Unable to retrieve team members for match ID: {match_id}.")
-        return jsonify({'error': 'Unable to retrieve team members.'}), 404
+        return {'error': 'Unable to retrieve team members.'}
 
-    # Calculate scores
-    scores = calculate_scores(team_members, match_data)
+    result = {'scores': sorted(scores, key=lambda x: x['score'])}
+    cache.set(cache_key, result, timeout=settings.Config.SEARCH_RESULT_TTL)
+    return result
+
+@app.route('/api/search', methods=['GET'])
+def search_player():
+    """
+    Search for a player and calculate team scores.
+    """
+    summoner_name = request.args.get('summoner_name')
+    summoner_tagline = request.args.get('summoner_tagline')
+
+    if not summoner_name or not summoner_tagline:
+        logging.warning("Summoner name or tagline missing in the request.")
+        return jsonify({'error': 'Summoner name and tagline are required.'}), 400
+
+    logging.info(f"Searching for summoner: {summoner_name}#{summoner_tagline}")
+
+    # Friends tend to search the same Riot ID at once; let them share one lookup
+    riot_id = f"{summoner_name}#{summoner_tagline}".lower()
+    with riot_priority(INTERACTIVE):
+        result = search_flight.do(riot_id, search_latest_match, summoner_name, summoner_tagline)
+    if 'error' in result:
+        return jsonify({'error': result['error']}), 404
+    scores_sorted = result['scores']
 
     # Identify the player with the lowest score
-    scores_sorted = sorted(scores, key=lambda x: x['score'])
     player_to_remove = scores_sorted[0] if scores_sorted else None
 
     # Handle queue logic
@@ -237,348 +338,563 @@ def get_players():
 @app.route('/api/leaderboard', methods=['GET'])
 def get_leaderboard():
     """
-    Retrieve the leaderboard data from the cache.
+    Retrieve the leaderboard data from the shared cache.
     """
-    leaderboard_data = cache.get('leaderboard_data')
-    if leaderboard_data:
-        return jsonify({'leaderboard': leaderboard_data}), 200
-    else:
+    snapshot = cache_lookup('leaderboard', 'leaderboard_snapshot', snapshot_cache)
+    if snapshot:
+        return jsonify({'leaderboard': snapshot['leaderboard'], 'version': snapshot['version'],
+                        'size': LEADERBOARD_SIZE}), 200
+
+    # No refresh has been published yet; serve straight from the read model
+    try:
+        players = Player.query.order_by(Player.average_score.desc()).limit(LEADERBOARD_SIZE).all()
+        return jsonify({'leaderboard': rank_rows(leaderboard_row(p) for p in players), 'version': 0,
+                        'size': LEADERBOARD_SIZE}), 200
+    except Exception as e:
+        logging.error(f"Error in /api/leaderboard: {str(e)}")
         return jsonify({'error': 'Unable to retrieve leaderboard data.'}), 500
 
 
-def update_leaderboard():
+def fetch_new_match_ids(player_info, puuid, last_match_id):
     """
-    Updates the leaderboard by checking for new matches for each player.
+    Finds a tracked player's matches played since last_match_id.
+
+    Only talks to Riot, so it can run on a worker greenlet. Returns a dict
+    with the player's PUUID, latest match ID and new match IDs (newest
+    first), or None when there is nothing to ingest.
     """
-    with app.app_context():
-        for player_info in PREDEFINED_PLAYERS:
-            summoner_name = player_info['summoner_name']
-            tagline = player_info['tagline']
-
-            # 1) Fetch player from database or create if not exists
-            player = Player.query.filter_by(summoner_name=summoner_name, tagline=tagline).first()
-            if not player:
-                # Fetch player PUUID
-                player_data = get_summoner_info(summoner_name, tagline, region=settings.Config.DEFAULT_REGION)
-                if not player_data:
-                    logging.error(f"[LB] Player {summoner_name}#{tagline} not found via get_summoner_info.")
-                    continue
+    summoner_name = player_info['summoner_name']
+    tagline = player_info['tagline']
 
-                puuid = player_data.get('puuid')
-                if not puuid:
-                    logging.error(f"[LB] PUUID not found for {summoner_name}#{tagline}.")
-                    continue
+    # 1) New players need their PUUID first
+    if not puuid:
+        player_data = get_summoner_info(summoner_name, tagline, region=settings.Config.DEFAULT_REGION)
+        if not player_data:
+            logging.error(f"[LB] Player {summoner_name}#{tagline} not found via get_summoner_info.")
+            return None
+
+        puuid = player_data.get('puuid')
+        if not puuid:
+            logging.error(f"[LB] PUUID not found for {summoner_name}#{tagline}.")
+            return None
+
+    result = {'player_info': player_info, 'puuid': puuid, 'latest_match_id': None, 'new_match_ids': []}
+
+    # 2) Fetch the latest match ID from Match-V5
+    match_ids = get_match_ids_by_summoner_puuid(puuid, count=1, region=settings.Config.DEFAULT_REGION)
+    if not match_ids:
+        logging.info(f"[LB] No matches found for {summoner_name}#{tagline}")
+        return result
+
+    latest_match_id = match_ids[0]
+    logging.debug(f"[LB] Latest match for {summoner_name}#{tagline} => {latest_match_id}")
+
+    # 3) Check if the latest match is already processed
+    if last_match_id == latest_match_id:
+        logging.info(f"[LB] No new matches for {summoner_name}#{tagline}")
+        return result
+
+    # 4) Fetch new matches since the last processed match
+    all_match_ids = get_match_ids_by_summoner_puuid(puuid, start=0, count=10, region=settings.Config.DEFAULT_REGION)
+    if not all_match_ids:
+        logging.info(f"[LB] No match IDs to process for {summoner_name}#{tagline}")
+        return result
+
+    if last_match_id in all_match_ids:
+        new_match_ids = all_match_ids[:all_match_ids.index(last_match_id)]
+    else:
+        # Last match ID not found; process all matches
+        new_match_ids = all_match_ids
+        if last_match_id:
+            logging.warning(f"[LB] More than {len(all_match_ids)} new matches for {summoner_name}#{tagline}; "
+                            f"older ones are only picked up by backfill_season.py")
 
-                # Create new Player instance
-                player = Player(summoner_name=summoner_name, tagline=tagline, puuid=puuid)
-                db.session.add(player)
-                db.session.commit()
-                logging.info(f"[LB] Created new Player in DB: {player}")
-            else:
-                puuid = player.puuid
+    result['latest_match_id'] = latest_match_id
+    result['new_match_ids'] = new_match_ids[:MATCH_WINDOW]
+    return result
 
-            # 2) Fetch the latest match ID from Match-V5
-            match_ids = get_match_ids_by_summoner_puuid(puuid, count=1, region=settings.Config.DEFAULT_REGION)
-            if not match_ids:
-                logging.info(f"[LB] No matches found for {summoner_name}#{tagline}")
-                continue
 
-            latest_match_id = match_ids[0]
-            logging.debug(f"[LB] Latest match for {summoner_name}#{tagline} => {latest_match_id}")
+def build_match_rows(match_id, tracked_players, participants_only=False):
+    """
+    Fetches one match and scores every tracked player who took part in it.
+
+    tracked_players maps PUUID -> player ID for the players that still need a
+    row for this match; with participants_only it may hold every tracked
+    player, and is narrowed to the match's participants once it is fetched.
+    Only talks to Riot, so it can run on a worker greenlet. Returns one Match
+    row (as a dict of column values) per tracked participant, or an empty
+    list if the match isn't a Flex game.
+    """
+    # Only the projected match is kept while opponent ranks are looked up
+    parsed = load_match(match_id, region=settings.Config.DEFAULT_REGION)
+    if not parsed:
+        logging.warning(f"[LB] Could not retrieve match data for {match_id}")
+        return []
+
+    if parsed.queue_id != 440:
+        logging.info(f"[LB] Skipping match {match_id} because queueId={parsed.queue_id} != 440 (Flex)")
+        return []
+
+    if participants_only:
+        tracked_players = {puuid: player_id for puuid, player_id in tracked_players.items()
+                           if parsed.participant(puuid) is not None}
+    rows = []
+    for puuid, player_id in tracked_players.items():
+        # 5) Identify our tracked player's performance data
+        member = parsed.participant(puuid)
+        if member is None:
+            logging.warning(f"[LB] Player {player_id} not found in match {match_id}")
+            continue
+        assigned_role = member['assignedRole']
+        logging.debug(f"[LB] Found player's assigned_role={assigned_role} in match={match_id}")
+
+        # Calculate score
+        match_score = parsed.metrics(puuid)['score']
+
+        # 6) Find the lane opponent
+        lane_opponent = parsed.lane_opponent(puuid)
+        game_duration_seconds = parsed.game_duration
+        game_duration_minutes = game_duration_seconds / 60.0
+
+        # 7) Fetch the lane opponent's rank
+        opponent_lane_rank = None
+        if lane_opponent:
+            opp_puuid = lane_opponent.get('puuid')
+            logging.debug(f"[LB] Found lane_opponent PUUID={opp_puuid}")
+            if opp_puuid:
+                opp_summ_id = get_summoner_id_by_puuid(opp_puuid, region=settings.Config.DEFAULT_REGION_CODE)
+                if opp_summ_id:
+                    rank_num = fetch_flex_then_solo_rank_numeric(opp_summ_id, region=settings.Config.DEFAULT_REGION_CODE)
+                    if rank_num is not None:
+                        opponent_lane_rank = rank_num
+                    else:
+                        logging.info(f"[LB] Opponent unranked or rank fetch failed for SummID={opp_summ_id}")
+                else:
+                    logging.info(f"[LB] Could not fetch SummID for opponent PUUID={opp_puuid}")
+            else:
+                logging.info("[LB] Opponent participant has no PUUID; skipping rank fetch.")
+        else:
+            logging.info(f"[LB] No lane opponent found for role={assigned_role} in match={match_id}")
+
+        # 8) Build the Match row
+        rows.append({
+            'match_id': match_id,
+            'player_id': player_id,
+            'score': match_score,
+            'kills': member.get('kills', 0),
+            'deaths': member.get('deaths', 0),
+            'assists': member.get('assists', 0),
+            'cs': member.get('totalMinionsKilled', 0) + member.get('neutralMinionsKilled', 0),
+            'timestamp': datetime.fromtimestamp(parsed.game_end_timestamp / 1000),
+            'assigned_role': assigned_role,
+            'opponent_lane_rank': opponent_lane_rank,
+            'game_duration': game_duration_minutes
+        })
+    return rows
+
+
+def _run_safely(func, *args, priority):
+    # Pool workers are fresh greenlets, so each sets its Riot priority itself
+    try:
+        with riot_priority(priority):
+            return func(*args)
+    except Exception:
+        logging.exception(f"[LB] {func.__name__} failed")
+        return None
 
-            # 3) Check if the latest match is already processed
-            if player.last_match_id == latest_match_id:
-                logging.info(f"[LB] No new matches for {summoner_name}#{tagline}")
-                continue
 
-            # 4) Fetch new matches since the last processed match
-            all_match_ids = get_match_ids_by_summoner_puuid(puuid, start=0, count=10, region=settings.Config.DEFAULT_REGION)
-            if not all_match_ids:
-                logging.info(f"[LB] No match IDs to process for {summoner_name}#{tagline}")
-                continue
+def insert_matches_ignoring_conflicts(rows):
+    """
+    Bulk inserts Match rows, skipping any that already exist.
+    Returns the (match_id, player_id) pairs that were actually inserted.
+    """
+    if not rows:
+        return set()
+
+    table = Match.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        # Rows were already deduplicated, so a plain insert is safe under the ingestion lease
+        db.session.execute(table.insert(), rows)
+        return {(row['match_id'], row['player_id']) for row in rows}
 
-            if player.last_match_id:
-                try:
-                    last_match_index = all_match_ids.index(player.last_match_id)
-                    new_match_ids = all_match_ids[:last_match_index]
-                except ValueError:
-                    # Last match ID not found; process all matches
-                    new_match_ids = all_match_ids
-            else:
-                new_match_ids = all_match_ids
+    statement = (insert(table)
+                 .on_conflict_do_nothing(index_elements=['match_id', 'player_id'])
+                 .returning(table.c.match_id, table.c.player_id))
+    result = db.session.execute(statement, rows)
+    return {(match_id, player_id) for match_id, player_id in result}
 
-            if not new_match_ids:
-                logging.info(f"[LB] No new matches to process for {summoner_name}#{tagline}")
-                continue
 
-            # Limit matches processed
-            new_match_ids = new_match_ids[:10]
+def store_match_rows(rows, players):
+    """
+    Stores scored match rows and keeps the players' read model in step: new
+    matches are folded into the running totals, then every given player's
+    window is trimmed to the newest MATCH_WINDOW matches, moving the rest to
+    the match archive. Shared by the live refresh and backfill_season.py; the
+    caller commits.
+
+    The players are reloaded after the insert has taken the write lock (and
+    locked FOR UPDATE on Postgres), so two processes storing matches for the
+    same player can't overwrite each other's totals. Returns the
+    (match_id, player_id) pairs that were inserted.
+    """
+    inserted = insert_matches_ignoring_conflicts(rows)
+    player_ids = {player.id for player in players}
+    if not player_ids:
+        return inserted
+    by_id = {player.id: player for player in Player.query.filter(Player.id.in_(player_ids))
+             .with_for_update().populate_existing()}
+    for row in rows:
+        if (row['match_id'], row['player_id']) in inserted:
+            apply_match_inserted(by_id[row['player_id']], Match(**row))
+
+    # Keep only the newest MATCH_WINDOW matches per player
+    window = {player_id: [] for player_id in by_id}
+    for match in Match.query.filter(Match.player_id.in_(window.keys())).all():
+        window[match.player_id].append(match)
+    evicted = []
+    for player in by_id.values():
+        recent_matches = sorted(window[player.id], key=lambda m: m.timestamp, reverse=True)
+        for old_match in recent_matches[MATCH_WINDOW:]:
+            evicted.append(old_match)
+            apply_match_evicted(player, old_match)
+        if len(recent_matches) > MATCH_WINDOW:
+            logging.info(f"[LB] Deleted {len(recent_matches) - MATCH_WINDOW} old matches for {player.summoner_name}#{player.tagline}")
+
+        # 10th-game score and most played role over the remaining window
+        update_window_fields(player, recent_matches[:MATCH_WINDOW])
+    if evicted:
+        # Archive before deleting; if that fails the cycle rolls back and nothing is lost
+        match_archive.append(evicted)
+        Match.query.filter(Match.id.in_([m.id for m in evicted])).delete(synchronize_session=False)
+    return inserted
 
-            # 5) Process each new match
-            for match_id in new_match_ids:
-                match_data = get_match_data(match_id, region=settings.Config.DEFAULT_REGION)
-                if not match_data:
-                    logging.warning(f"[LB] Could not retrieve match data for {match_id}")
-                    continue
 
-                queue_id = match_data.get('info', {}).get('queueId')
-                if queue_id != 440:
-                    logging.info(f"[LB] Skipping match {match_id} because queueId={queue_id} != 440 (Flex)")
-                    continue
+def update_leaderboard():
+    """
+    Updates the leaderboard by checking for new matches for each player
+    whose next poll is due (see schedule_next_poll).
+
+    Riot I/O runs on a bounded greenlet pool in two phases (new match IDs
+    per player, then each distinct new match once), while all database work
+    happens here: one query to load the players, one to drop already stored
+    (match_id, player_id) pairs, a bulk insert that ignores conflicts, one
+    query for the window eviction and a single commit for the whole cycle.
+    Nothing is written until the Riot work is done, except newly created
+    players, which get a short commit of their own before phase 2. Each
+    phase's duration is recorded in metrics.
+    """
+    with app.app_context():
+        phases = metrics.PhaseTimer(metrics.leaderboard_phase_duration)
+        pool = Pool(settings.Config.LEADERBOARD_REFRESH_CONCURRENCY)
+        players = {(p.summoner_name, p.tagline): p for p in Player.query.all()}
+        now = datetime.utcnow()
 
-                team_members = get_player_stats_in_match(puuid, match_data, team_only=True)
-                if not team_members:
-                    logging.warning(f"[LB] No team members found for match {match_id}")
+        # Phase 1: new match IDs per tracked player that is due a poll
+        workers = []
+        for player_info in PREDEFINED_PLAYERS:
+            player = players.get((player_info['summoner_name'], player_info['tagline']))
+            if player is not None and player.next_poll_at is not None and player.next_poll_at > now:
+                continue
+            workers.append((player_info, pool.spawn(
+                _run_safely, fetch_new_match_ids, player_info,
+                player.puuid if player else None, player.last_match_id if player else None,
+                priority=INGESTION)))
+        if not workers:
+            logging.debug("[LB] No players due a poll.")
+            return
+        # The Riot phases can outlast the lease on a cold start or under tight
+        # limits; renew it while they run and after each, and stop if another
+        # process took over
+        with ingestion_lease.heartbeat():
+            pool.join()
+            phases.end('match_ids')
+            if not ingestion_lease.keep_alive():
+                return
+
+            changed_player_ids = set()
+            refreshed = []
+            new_players = []
+            polled = []  # (player, found a new match); scheduled once the Riot work is done
+            for player_info, worker in workers:
+                result = worker.value
+                key = (player_info['summoner_name'], player_info['tagline'])
+                player = players.get(key)
+                if result is None:
+                    # Failed lookups back off like empty polls instead of retrying every tick
+                    if player is not None:
+                        polled.append((player, False))
                     continue
-
-                team_members = assign_roles_by_team_position(team_members)
-
-                # 6) Identify our tracked player's performance data
-                for member in team_members:
-                    if member['puuid'] == puuid:
-                        assigned_role = member.get('assignedRole', 'Undefined')
-                        logging.debug(f"[LB] Found player's assigned_role={assigned_role} in match={match_id}")
-
-                        existing_match = Match.query.filter_by(match_id=match_id, player_id=player.id).first()
-                        if existing_match:
-                            logging.info(f"[LB] Match {match_id} for {player.summoner_name} already exists; skipping.")
-                            continue
-
-                        # Calculate score
-                        scores = calculate_scores([member], match_data)
-                        match_score = scores[0]['score']
-
-                        # Update all-time highest/lowest
-                        if match_score > player.all_time_highest_score:
-                            player.all_time_highest_score = match_score
-                        if player.all_time_lowest_score is None or match_score < player.all_time_lowest_score:
-                            player.all_time_lowest_score = match_score
-
-                        # 7) Find the lane opponent
-                        all_parts = match_data['info']['participants']
-                        player_team_id = member.get('teamId', None)
-                        if player_team_id is None:
-                            logging.warning(f"[LB] Missing teamId for {player.summoner_name}, skipping lane opponent logic.")
-                            lane_opponent = None
-                        else:
-                            enemy_parts = [p for p in all_parts if p['teamId'] != player_team_id]
-                            lane_opponent = None
-                            logging.debug(f"[LB] Looking for lane_opponent matching role={assigned_role} among {len(enemy_parts)} enemies")
-                            for enemy in enemy_parts:
-                                # We re-run role assignment for the enemy to see their assigned role
-                                enemy_assigned_role = assign_roles_by_team_position([enemy])[0].get('assignedRole', 'Undefined')
-                                logging.debug(f"[LB] Enemy participant: teamPosition={enemy.get('teamPosition')} => assignedRole={enemy_assigned_role}")
-                                if enemy_assigned_role == assigned_role:
-                                    lane_opponent = enemy
-                                    break
-                        game_duration_seconds = match_data['info'].get('gameDuration', 0)
-                        game_duration_minutes = game_duration_seconds / 60.0
-
-                        # 8) Fetch the lane opponent's rank
-                        opponent_lane_rank = None
-                        if lane_opponent:
-                            opp_puuid = lane_opponent.get('puuid')
-                            logging.debug(f"[LB] Found lane_opponent PUUID={opp_puuid}")
-                            if opp_puuid:
-                                # Option A: Using your new Account-V1 approach
-                                opp_summ_id = get_summoner_id_by_puuid(opp_puuid, region=settings.Config.DEFAULT_REGION_CODE)
-                                if opp_summ_id:
-                                    rank_num = fetch_flex_then_solo_rank_numeric(opp_summ_id, region=settings.Config.DEFAULT_REGION_CODE)
-                                    if rank_num is not None:
-                                        opponent_lane_rank = rank_num
-                                    else:
-                                        logging.info(f"[LB] Opponent unranked or rank fetch failed for SummID={opp_summ_id}")
-                                else:
-                                    logging.info(f"[LB] Could not fetch SummID for opponent PUUID={opp_puuid}")
-                            else:
-                                logging.info("[LB] Opponent participant has no PUUID; skipping rank fetch.")
-                        else:
-                            logging.info(f"[LB] No lane opponent found for role={assigned_role} in match={match_id}")
-
-                        # 9) Create the Match entry
-                        match_obj = Match(
-                            match_id=match_id,
-                            player_id=player.id,
-                            score=match_score,
-                            kills=member.get('kills', 0),
-                            deaths=member.get('deaths', 0),
-                            assists=member.get('assists', 0),
-                            cs=member.get('totalMinionsKilled', 0) + member.get('neutralMinionsKilled', 0),
-                            timestamp=datetime.fromtimestamp(match_data['info']['gameEndTimestamp'] / 1000),
-                            assigned_role=assigned_role,
-                            opponent_lane_rank=opponent_lane_rank,
-                            game_duration=game_duration_minutes  
-
-                        )
-                        db.session.add(match_obj)
-
-                time.sleep(1.2)  # optional rate-limit spacing
-
-            # 10) Commit new matches
-            db.session.commit()
-
-            # Update player's last_match_id
-            player.last_match_id = latest_match_id
-
-            # Remove old matches if total exceeds 10
-            player_matches = player.matches
-            if len(player_matches) > 10:
-                matches_to_delete = sorted(player_matches, key=lambda m: m.timestamp)[:-10]
-                for old_match in matches_to_delete:
-                    db.session.delete(old_match)
+                if player is None:
+                    player = Player(summoner_name=key[0], tagline=key[1], puuid=result['puuid'])
+                    db.session.add(player)
+                    players[key] = player
+                    new_players.append(player)
+                    refreshed.append((player, result))
+                    logging.info(f"[LB] Created new Player in DB: {player}")
+                elif result['latest_match_id']:
+                    refreshed.append((player, result))
+                polled.append((player, bool(result['latest_match_id'])))
+            if new_players:
+                # Phase 2 needs their IDs. Commit them on their own rather than
+                # flushing, so SQLite's write lock isn't held while it talks to Riot
+                if not ingestion_lease.renew(db.session):
+                    db.session.rollback()
+                    return
                 db.session.commit()
-                logging.info(f"[LB] Deleted {len(matches_to_delete)} old matches for {summoner_name}#{tagline}")
-
-            # Recalculate total/average score
-            player_matches = player.matches
-            total_score = sum(m.score for m in player_matches)
-            count_matches = len(player_matches)
-            player.average_score = total_score / count_matches if count_matches > 0 else 0.0
-            player.total_score = total_score
-
-            # Most played role over last 10
-            recent_matches = sorted(player_matches, key=lambda m: m.timestamp, reverse=True)[:10]
-            most_played_role = calculate_most_played_role(recent_matches)
-            player.most_played_role = most_played_role
 
+            # Drop (match_id, player_id) pairs we already store, in one query
+            candidates = {(match_id, player.id) for player, result in refreshed for match_id in result['new_match_ids']}
+            if candidates:
+                stored = set(db.session.query(Match.match_id, Match.player_id).filter(
+                    Match.match_id.in_({match_id for match_id, _ in candidates})).all())
+                candidates -= stored
+            phases.end('dedupe')
+
+            # Phase 2: tracked players often queue together, so fetch each new match
+            # once and score every tracked participant who still needs a row for it
+            tracked_by_match = {}
+            puuids = {player.id: player.puuid for player, _ in refreshed}
+            for match_id, player_id in candidates:
+                tracked_by_match.setdefault(match_id, {})[puuids[player_id]] = player_id
+            workers = [pool.spawn(_run_safely, build_match_rows, match_id, tracked_players, priority=INGESTION)
+                       for match_id, tracked_players in tracked_by_match.items()]
+            pool.join()
+            rows = [row for worker in workers for row in (worker.value or [])]
+            phases.end('matches')
+
+        # Renewed in the store transaction, so the work only commits while we hold the lease
+        if not ingestion_lease.renew(db.session):
+            db.session.rollback()
+            return
+
+        # 9) Store new matches, fold them into the read model and trim each window
+        inserted = store_match_rows(rows, [player for player, _ in refreshed])
+        for player, result in refreshed:
+            if result['latest_match_id']:
+                player.last_match_id = result['latest_match_id']
             player.last_updated = datetime.utcnow()
-            db.session.commit()
-
-            logging.info(f"[LB] Updated {summoner_name}#{tagline}: "
-                         f"Avg={player.average_score:.2f}, "
-                         f"MostPlayedRole={player.most_played_role}, "
-                         f"LastMatchID={player.last_match_id}")
-
-            time.sleep(1.2)  # optional delay between players
-
-        # 11) Update the cached leaderboard
-        leaderboard_entries = Player.query.order_by(Player.average_score.desc()).limit(100).all()
-        leaderboard_data = []
-        for entry in leaderboard_entries:
-            matches = sorted(entry.matches, key=lambda m: m.timestamp, reverse=True)
-            if len(matches) >= 10:
-                tenth_game = matches[-1]
-                tenth_game_score = tenth_game.score
-            else:
-                tenth_game_score = None
+            changed_player_ids.add(player.id)
+        for player, found_new in polled:
+            schedule_next_poll(player, found_new, now, settings.Config.POLL_MIN_INTERVAL,
+                               settings.Config.POLL_MAX_INTERVAL)
+        db.session.commit()
+        phases.end('store')
+        metrics.leaderboard_matches_ingested.inc(len(inserted))
+        metrics.leaderboard_last_cycle_matches.set(len(inserted))
+        logging.info(f"[LB] Stored {len(inserted)} new matches for {len(refreshed)} players.")
+
+        # 10) Update the cached leaderboard and stats
+        publish_leaderboard(changed_player_ids)
+        if changed_player_ids:
+            refresh_stats_snapshot()
+            invalidate_scores_cache()
+        phases.end('publish')
+        logging.info(f"[LB] Match store: {match_store.stats()}")
+        logging.info(f"[LB] Opponent caches: summoner IDs {summoner_id_cache.stats()}, ranks {rank_cache.stats()}")
+
+
+def publish_leaderboard(changed_player_ids):
+    """
+    Publishes the leaderboard snapshot from the Player read model.
+
+    Only rows of players that changed this cycle are rebuilt. The whole
+    snapshot is written under a single cache key, so every worker switches to
+    the new version at once. When no snapshot exists yet every player is
+    reconciled against their stored matches once, which also repairs any
+    drift in the running totals.
+
+    Each new version is broadcast as a 'leaderboard_delta' carrying only the
+    rows that changed; the last few deltas are kept in the snapshot so
+    clients that fell behind can catch up (see handle_leaderboard_resync).
+    A cycle that changes no row publishes nothing. Without
+    SOCKETIO_MESSAGE_QUEUE the broadcast only reaches this worker's clients;
+    the others pick the new version up on their next resync.
+    """
+    snapshot = snapshot_cache.get('leaderboard_snapshot')
+    if snapshot is None:
+        rows = {}
+        players = Player.query.options(selectinload(Player.matches)).all()
+        for player in players:
+            reconcile_player(player, player.matches)
+            rows[player.id] = leaderboard_row(player)
+        db.session.commit()
+        version = 1
+        base_version = None
+        changed_rows = list(rows.values())
+        deltas = []
+        logging.info(f"[LB] Rebuilt leaderboard read model for {len(players)} players.")
+    elif changed_player_ids:
+        rows = snapshot['rows']
+        changed_rows = []
+        for player in Player.query.filter(Player.id.in_(changed_player_ids)).all():
+            row = leaderboard_row(player)
+            if rows.get(player.id) != row:
+                changed_rows.append(row)
+            rows[player.id] = row
+        if not changed_rows:
+            logging.info("[LB] Leaderboard rows unchanged this cycle.")
+            return snapshot
+        version = snapshot['version'] + 1
+        base_version = snapshot['version']
+        deltas = snapshot['deltas']
+    else:
+        logging.info("[LB] No leaderboard changes this cycle.")
+        return snapshot
+
+    delta = {'version': version, 'base_version': base_version, 'changed': changed_rows}
+    snapshot = {
+        'version': version,
+        'published_at': datetime.utcnow().isoformat(),
+        'rows': rows,
+        'leaderboard': rank_rows(rows.values()),
+        'deltas': (deltas + [delta])[-LEADERBOARD_DELTA_HISTORY:]
+    }
+    snapshot_cache.set('leaderboard_snapshot', snapshot, timeout=0)
+    socketio.emit('leaderboard_delta', delta)
+    logging.info(f"[LB] Published leaderboard v{version} ({len(changed_rows)} rows changed).")
+    return snapshot
 
-            # Compute average opponent rank over the last 10 matches
-            last_10_matches = matches[:10]
-            valid_ranks = [m.opponent_lane_rank for m in last_10_matches if m.opponent_lane_rank is not None]
-            if valid_ranks:
-                avg_opponent_rank = sum(valid_ranks) / len(valid_ranks)
-            else:
-                avg_opponent_rank = None
 
+def build_stats_snapshot():
+    """
+    Computes every /api/stats table from one aggregate scan over matches.
+    Returns the response payload together with its ETag.
+    """
+    totals = db.session.query(
+            Player.summoner_name,
+            Player.tagline,
+            func.sum(Match.kills).label('total_kills'),
+            func.sum(Match.deaths).label('total_deaths'),
+            func.sum(Match.assists).label('total_assists'),
+            # CS/min: Sum of CS divided by sum of game durations
+            (func.sum(Match.cs) / func.sum(Match.game_duration)).label('cs_per_min')
+        ) \
+        .join(Match, Match.player_id == Player.id) \
+        .group_by(Player.id, Player.summoner_name, Player.tagline) \
+        .all()
 
-            leaderboard_data.append({
-                'summoner_name': entry.summoner_name,
-                'tagline': entry.tagline,
-                'average_score': entry.average_score,
-                'last_updated': entry.last_updated.isoformat(),
-                'highest_score': entry.all_time_highest_score,
-                'lowest_score': entry.all_time_lowest_score,
-                'tenth_game_score': tenth_game_score,
-                'most_played_role': entry.most_played_role,
-                'average_opponent_rank': avg_opponent_rank
-            })
+    # Helper function to rank the aggregated rows by one column
+    def format_results(value_key):
+        ranked = sorted(
+            totals,
+            key=lambda r: (getattr(r, value_key) is not None, getattr(r, value_key) or 0),
+            reverse=True
+        )
+        return [
+            {
+                'summoner_name': r.summoner_name,
+                'tagline': r.tagline,
+                'value': getattr(r, value_key)
+            }
+            for r in ranked
+        ]
 
-        cache.set('leaderboard_data', leaderboard_data, timeout=300)
-        logging.info("[LB] Leaderboard data updated and cached.")
+    data = {
+        'most_kills': format_results('total_kills'),
+        'most_deaths': format_results('total_deaths'),
+        'most_assists': format_results('total_assists'),
+        'most_cs': format_results('cs_per_min')
+    }
+    etag = hashlib.sha1(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()
+    return {'data': data, 'etag': etag}
 
 
+def refresh_stats_snapshot():
+    """Materializes the /api/stats payload; called when new matches are ingested."""
+    snapshot = build_stats_snapshot()
+    snapshot_cache.set('stats_snapshot', snapshot, timeout=0)
+    return snapshot
 
 
-def calculate_most_played_role(matches):
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
     """
-    Calculate the most played role based on roles stored in match data.
+    Serve the precomputed stats snapshot, answering 304 when the client's
+    ETag is still current.
     """
-    role_counts = {"Top": 0, "Jungle": 0, "Mid": 0, "ADC": 0, "Support": 0, "Undefined": 0}
-    for match in matches:
-        role = match.assigned_role
-        if role in role_counts:
-            role_counts[role] += 1
+    snapshot = cache_lookup('stats', 'stats_snapshot', snapshot_cache)
+    if snapshot is None:
+        snapshot = refresh_stats_snapshot()
 
-    # Find the role with the highest count
-    most_played_role = max(role_counts, key=role_counts.get)
-    return most_played_role
+    response = jsonify(snapshot['data'])
+    response.set_etag(snapshot['etag'])
+    # Let browsers keep the body but revalidate it on every page view
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
-@app.route('/api/stats', methods=['GET'])
-def get_stats():
-    # Query for kills, returning all players sorted by total kills desc
-    kills_query = db.session.query(Player, func.sum(Match.kills).label('total_kills')) \
-        .join(Match, Match.player_id == Player.id) \
-        .group_by(Player.id) \
-        .order_by(func.sum(Match.kills).desc()) \
-        .all()
 
-    # Query for deaths
-    deaths_query = db.session.query(Player, func.sum(Match.deaths).label('total_deaths')) \
-        .join(Match, Match.player_id == Player.id) \
-        .group_by(Player.id) \
-        .order_by(func.sum(Match.deaths).desc()) \
-        .all()
+def supports_window_functions():
+    """SQLite only has ROW_NUMBER() OVER from 3.25; PostgreSQL always does."""
+    if db.engine.dialect.name != 'sqlite':
+        return True
+    return sqlite3.sqlite_version_info >= (3, 25, 0)
 
-    # Query for assists
-    assists_query = db.session.query(Player, func.sum(Match.assists).label('total_assists')) \
-        .join(Match, Match.player_id == Player.id) \
-        .group_by(Player.id) \
-        .order_by(func.sum(Match.assists).desc()) \
-        .all()
 
-    # Query for CS/min: Sum of CS divided by sum of game durations
-    cs_query = db.session.query(
-            Player,
-            (func.sum(Match.cs) / func.sum(Match.game_duration)).label('cs_per_min')
-        ) \
-        .join(Match, Match.player_id == Player.id) \
-        .group_by(Player.id) \
-        .order_by((func.sum(Match.cs) / func.sum(Match.game_duration)).desc()) \
+def query_recent_scores(n):
+    """
+    Returns {summoner_name: [scores]} with each player's last n scores in
+    chronological order, using a single query.
+    """
+    # Matches played at the same time are ordered by id, so ties never add rows
+    if supports_window_functions():
+        ranked = db.session.query(
+            Match.id,
+            Match.player_id,
+            Match.score,
+            Match.timestamp,
+            func.row_number().over(partition_by=Match.player_id,
+                                   order_by=(Match.timestamp.desc(), Match.id.desc())).label('rn')
+        ).subquery()
+        recent = and_(ranked.c.player_id == Player.id, ranked.c.rn <= n)
+    else:
+        # Fallback: a match is among the last n if fewer than n newer ones exist
+        newer = aliased(Match)
+        newer_count = select(func.count(newer.id)) \
+            .where(newer.player_id == Match.player_id,
+                   or_(newer.timestamp > Match.timestamp,
+                       and_(newer.timestamp == Match.timestamp, newer.id > Match.id))) \
+            .scalar_subquery()
+        ranked = db.session.query(Match.id, Match.player_id, Match.score, Match.timestamp) \
+            .filter(newer_count < n) \
+            .subquery()
+        recent = ranked.c.player_id == Player.id
+
+    rows = db.session.query(Player.summoner_name, ranked.c.score) \
+        .outerjoin(ranked, recent) \
+        .order_by(Player.id, ranked.c.timestamp.asc(), ranked.c.id.asc()) \
         .all()
 
-    # Helper function to format query results
-    def format_results(query_results, value_key):
-        # query_results is a list of tuples: (Player, value)
-        # value_key is a string like 'total_kills'
-        return [
-            {
-                'summoner_name': r[0].summoner_name,
-                'tagline': r[0].tagline,
-                'value': getattr(r, value_key)
-            }
-            for r in query_results
-        ]
+    results = {}
+    for summoner_name, score in rows:
+        scores = results.setdefault(summoner_name, [])
+        if score is not None:
+            scores.append(score)
+    return results
 
-    response = {
-        'most_kills': format_results(kills_query, 'total_kills'),
-        'most_deaths': format_results(deaths_query, 'total_deaths'),
-        'most_assists': format_results(assists_query, 'total_assists'),
-        'most_cs': format_results(cs_query, 'cs_per_min')
-    }
 
-    return jsonify(response), 200
+def invalidate_scores_cache():
+    """Called after new matches are committed; old /api/scores entries stop matching."""
+    snapshot_cache.set('scores_version', (snapshot_cache.get('scores_version') or 0) + 1, timeout=0)
 
 
 @app.route('/api/scores', methods=['GET'])
 def get_scores():
     try:
-        # Fetch all players
-        players = Player.query.all()
-        
-        results = {}
-
-        for player in players:
-            # Query the last 10 games for each player, ordered by match date (desc)
-            scores_query = db.session.query(Match.score).filter(Match.player_id == player.id) \
-                .order_by(Match.timestamp.asc()).limit(10).all()
-            
-            # Extract scores and add them to the results dictionary
-            results[player.summoner_name] = [score[0] for score in scores_query]
-
-        # Prepare the response
-        response = {
-            "player_scores": results
-        }
+        # Number of most recent games per player; only MATCH_WINDOW are stored
+        n = max(1, min(request.args.get('n', default=MATCH_WINDOW, type=int), MATCH_WINDOW))
+
+        cache_key = f"scores:{snapshot_cache.get('scores_version') or 0}:{n}"
+        response = cache_lookup('scores', cache_key)
+        if response is None:
+            response = {
+                "player_scores": query_recent_scores(n)
+            }
+            cache.set(cache_key, response)
 
         return jsonify(response), 200
 
@@ -588,6 +904,19 @@ def get_scores():
         return jsonify({"error": "Internal server error"}), 500
 
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Prometheus scrape endpoint for this worker process. Needs the bearer
+    token in METRICS_TOKEN; answers 404 without one, as if it didn't exist.
+    """
+    token = settings.Config.METRICS_TOKEN
+    supplied = request.headers.get('Authorization', '')
+    if not token or not hmac.compare_digest(supplied.encode('utf-8'), f"Bearer {token}".encode('utf-8')):
+        return jsonify({"error": "Not found"}), 404
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 
 # Define Socket.IO event handlers
 @socketio.on('connect')
@@ -598,6 +927,25 @@ def handle_connect():
 def handle_disconnect():
     logging.info("A client has disconnected.")
 
+@socketio.on('leaderboard_resync')
+def handle_leaderboard_resync(data):
+    """
+    Brings a client from its leaderboard version up to date: the missed deltas
+    when they are still in the history, otherwise a full snapshot.
+    """
+    client_version = (data or {}).get('version')
+    snapshot = cache_lookup('leaderboard', 'leaderboard_snapshot', snapshot_cache)
+    if snapshot is None or client_version == snapshot['version']:
+        return
+
+    missed = [d for d in snapshot['deltas'] if client_version is not None and d['version'] > client_version]
+    if missed and missed[0]['base_version'] == client_version:
+        for delta in missed:
+            emit('leaderboard_delta', delta)
+    else:
+        emit('leaderboard_snapshot', {'version': snapshot['version'], 'leaderboard': snapshot['leaderboard'],
+                                      'size': LEADERBOARD_SIZE})
+
 # Run the SocketIO server
 if __name__ == '__main__':
     socketio.run(app, host='0.0.0.0', port=5000)
\ No newline at end of file
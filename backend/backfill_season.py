@@ -0,0 +1,203 @@
+# backfill_season.py
+"""
+Backfills tracked players' Flex matches over a time range, e.g. a season.
+
+update_leaderboard only looks at each player's 10 newest match IDs, so after
+downtime anything older is never stored. This pages through Match-V5
+by-puuid/ids (100 IDs per page, optionally bounded by --start/--end),
+fetches the new matches on a greenlet pool at backfill priority and stores
+them through the live refresh's path (app.store_match_rows), one page per
+transaction. Each player's progress is checkpointed in backfill_checkpoints
+in that same transaction, so an interrupted run resumes where it stopped.
+
+    python backfill_season.py --name s2026 --start 2026-01-08
+    python backfill_season.py --name s2026 --player "lil newton#EUNE"
+
+It can run next to the web app: it never takes the ingestion lease, its Riot
+calls leave the interactive and ingestion shares of every rate limit alone
+(the limiter learns what the app spent from Riot's count headers) and each
+write transaction covers a single page. Matches older than a player's
+newest MATCH_WINDOW still count towards their all-time high and low.
+"""
+
+# Importing app first applies gevent's monkey patching before anything else loads
+from app import (
+    PREDEFINED_PLAYERS,
+    _run_safely,
+    app,
+    build_match_rows,
+    db,
+    invalidate_scores_cache,
+    publish_leaderboard,
+    refresh_stats_snapshot,
+    scheduler,
+    store_match_rows
+)
+
+import argparse
+import logging
+import sys
+from datetime import datetime, timezone
+
+from gevent.pool import Pool
+
+import settings
+from match_archive import match_archive
+from models import BackfillCheckpoint, Match, Player
+from RateLimiter import BACKFILL
+from riot_api import get_match_ids_by_summoner_puuid, get_summoner_info, riot_priority
+
+# Riot's maximum for one by-puuid/ids request
+PAGE_SIZE = 100
+
+
+def parse_date(value):
+    """Parses a YYYY-MM-DD date (UTC midnight) into epoch seconds."""
+    return int(datetime.strptime(value, '%Y-%m-%d').replace(tzinfo=timezone.utc).timestamp())
+
+
+def load_players(riot_ids):
+    """
+    Returns the Player rows to backfill, creating any tracked player the live
+    job hasn't stored yet. riot_ids limits it to some name#tag entries.
+    """
+    wanted = {riot_id.lower() for riot_id in riot_ids or []}
+    existing = {(p.summoner_name, p.tagline): p for p in Player.query.all()}
+    players = []
+    for player_info in PREDEFINED_PLAYERS:
+        key = (player_info['summoner_name'], player_info['tagline'])
+        if wanted and f"{key[0]}#{key[1]}".lower() not in wanted:
+            continue
+        player = existing.get(key)
+        if player is None:
+            with riot_priority(BACKFILL):
+                player_data = get_summoner_info(key[0], key[1], region=settings.Config.DEFAULT_REGION)
+            if not player_data or not player_data.get('puuid'):
+                logging.error(f"[Backfill] Player {key[0]}#{key[1]} not found; skipping.")
+                continue
+            player = Player(summoner_name=key[0], tagline=key[1], puuid=player_data['puuid'])
+            db.session.add(player)
+            db.session.commit()
+            logging.info(f"[Backfill] Created new Player in DB: {player}")
+        players.append(player)
+    return players
+
+
+def load_checkpoint(name, player, start_time, end_time, restart):
+    """
+    Returns the player's checkpoint for this backfill, creating (or resetting)
+    it as needed. A resumed checkpoint keeps its original time range.
+    """
+    checkpoint = db.session.get(BackfillCheckpoint, (name, player.id))
+    if checkpoint is None:
+        checkpoint = BackfillCheckpoint(name=name, player_id=player.id)
+        db.session.add(checkpoint)
+    elif not restart:
+        if (start_time is not None and start_time != checkpoint.start_time
+                or end_time is not None and end_time != checkpoint.end_time):
+            logging.warning(f"[Backfill] {name} for {player.summoner_name}#{player.tagline} keeps its "
+                            f"original time range; use --restart to change it")
+        return checkpoint
+
+    checkpoint.start_time = start_time
+    # Pin the end so page offsets don't shift as new games are played
+    checkpoint.end_time = end_time if end_time is not None else int(datetime.now(timezone.utc).timestamp())
+    checkpoint.next_start = 0
+    checkpoint.matches_stored = 0
+    checkpoint.completed_at = None
+    checkpoint.updated_at = datetime.utcnow()
+    db.session.commit()
+    return checkpoint
+
+
+def load_archived_pairs(player_ids):
+    """Returns the (match_id, player_id) pairs already evicted to the match archive."""
+    archived = match_archive.load(['match_id', 'player_id'], player_ids=player_ids)
+    return {(match_id.decode('utf-8'), player_id)
+            for match_id, player_id in zip(archived['match_id'].tolist(), archived['player_id'].tolist())}
+
+
+def backfill_player(player, checkpoint, tracked_players, pool, stored_pairs):
+    """
+    Pages through one player's match IDs from the checkpoint onwards.
+    stored_pairs holds (match_id, player_id) pairs stored outside the matches
+    table (archived, or by this run's earlier pages) and grows as pages are
+    stored. Returns True once the range is done, False if Riot stopped answering.
+    """
+    name = f"{player.summoner_name}#{player.tagline}"
+    while checkpoint.completed_at is None:
+        with riot_priority(BACKFILL):
+            match_ids = get_match_ids_by_summoner_puuid(
+                player.puuid, start=checkpoint.next_start, count=PAGE_SIZE,
+                region=settings.Config.DEFAULT_REGION,
+                start_time=checkpoint.start_time, end_time=checkpoint.end_time)
+        if match_ids is None:
+            logging.error(f"[Backfill] Could not page match IDs for {name}; rerun to resume.")
+            db.session.rollback()
+            return False
+
+        # Skip matches still in the player's window, archived, or already
+        # stored this run while backfilling a premade teammate
+        stored = {match_id for (match_id,) in db.session.query(Match.match_id).filter(
+            Match.player_id == player.id, Match.match_id.in_(match_ids))} if match_ids else set()
+        stored |= {match_id for match_id in match_ids if (match_id, player.id) in stored_pairs}
+        # Score every tracked player in the match, so teammates' pages skip it
+        workers = [pool.spawn(_run_safely, build_match_rows, match_id, tracked_players, True, priority=BACKFILL)
+                   for match_id in match_ids if match_id not in stored]
+        pool.join()
+        # Teammates' rows may have been archived already; don't store them again
+        rows = [row for worker in workers for row in (worker.value or [])
+                if (row['match_id'], row['player_id']) not in stored_pairs]
+
+        touched = {row['player_id'] for row in rows} | {player.id}
+        inserted = store_match_rows(rows, Player.query.filter(Player.id.in_(touched)).all())
+        checkpoint.next_start += len(match_ids)
+        checkpoint.matches_stored += len(inserted)
+        checkpoint.updated_at = datetime.utcnow()
+        if len(match_ids) < PAGE_SIZE:
+            checkpoint.completed_at = checkpoint.updated_at
+        db.session.commit()
+        stored_pairs.update((row['match_id'], row['player_id']) for row in rows)
+        logging.info(f"[Backfill] {name}: {checkpoint.next_start} match IDs paged, "
+                     f"{len(workers)} fetched, {len(inserted)} rows stored")
+
+        if inserted:
+            publish_leaderboard(touched)
+            refresh_stats_snapshot()
+            invalidate_scores_cache()
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill tracked players' Flex matches over a time range.")
+    parser.add_argument('--name', default='season', help="Checkpoint name; rerun with the same name to resume")
+    parser.add_argument('--start', type=parse_date, help="First day to include, YYYY-MM-DD (UTC)")
+    parser.add_argument('--end', type=parse_date, help="Day to stop before, YYYY-MM-DD (UTC); defaults to now")
+    parser.add_argument('--player', action='append', help="Only this name#tag (repeatable)")
+    parser.add_argument('--concurrency', type=int, default=settings.Config.LEADERBOARD_REFRESH_CONCURRENCY,
+                        help="Matches fetched at once")
+    parser.add_argument('--restart', action='store_true', help="Discard existing checkpoints and start over")
+    args = parser.parse_args()
+
+    # Importing app starts the live scheduler; this process only backfills
+    scheduler.shutdown(wait=False)
+
+    incomplete = []
+    with app.app_context():
+        players = load_players(args.player)
+        # Every stored player is tracked, including those not being backfilled
+        tracked_players = {player.puuid: player.id for player in Player.query.all()}
+        pool = Pool(args.concurrency)
+        stored_pairs = load_archived_pairs(list(tracked_players.values()))
+        for player in players:
+            checkpoint = load_checkpoint(args.name, player, args.start, args.end, args.restart)
+            if not backfill_player(player, checkpoint, tracked_players, pool, stored_pairs):
+                incomplete.append(f"{player.summoner_name}#{player.tagline}")
+
+    if incomplete:
+        sys.exit(f"Backfill {args.name} incomplete for: {', '.join(incomplete)}")
+    print(f"Backfill {args.name} complete for {len(players)} players.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+# bench_ingestion.py
+"""
+End-to-end ingestion benchmark against riot_stub.py, no Riot API key needed.
+
+For every roster size it starts from an empty database and caches and runs
+two leaderboard refreshes: a cold one that ingests each premade's recent
+history, then an incremental one after the stub has played a few new games.
+Each roster runs in its own process, so module-level caches and limiter
+state never leak between sizes.
+
+    python bench_ingestion.py                       # 15, 150 and 1500 players
+    python bench_ingestion.py --sizes 15 --latency 0.05 --app-limit 20:1,100:120
+
+Reported per cycle: wall time, Riot calls (and 429s) per ingested match,
+seconds spent sleeping in the rate limiter (summed over the worker
+greenlets, so it can exceed wall time) and database queries issued. With the
+default production-key limits the 1500-player cold cycle is bound by the
+limiter and takes about a quarter of an hour; raise --app-limit to measure
+our own overhead instead.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def start_stub(args, players):
+    command = [
+        sys.executable, os.path.join(BACKEND_DIR, 'riot_stub.py'),
+        '--port', str(args.port),
+        '--players', str(players),
+        '--history', str(args.history),
+        '--app-limit', args.app_limit,
+        '--method-limit', args.method_limit,
+        '--latency', str(args.latency),
+        '--jitter', str(args.jitter),
+        '--fail-rate', str(args.fail_rate)
+    ]
+    stub = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            requests.get(f"http://127.0.0.1:{args.port}/_stub/stats", timeout=1)
+            return stub
+        except requests.exceptions.ConnectionError:
+            time.sleep(0.1)
+    stub.kill()
+    sys.exit("riot_stub.py did not start")
+
+
+def run_roster(args, size):
+    """Runs both cycles for one roster size in a fresh process and returns its results."""
+    with tempfile.TemporaryDirectory(prefix='bench_ingestion_') as workdir:
+        env = dict(os.environ)
+        env.update({
+            'DATABASE_URI': f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+            'MATCH_STORE_PATH': os.path.join(workdir, 'match_store.db'),
+            'LOOKUP_CACHE_PATH': os.path.join(workdir, 'lookup_cache.db'),
+            'CACHE_DIR': os.path.join(workdir, 'flask_cache'),
+            'SNAPSHOT_CACHE_DIR': os.path.join(workdir, 'flask_cache_snapshots'),
+            'RIOT_API_BASE_URL': f"http://127.0.0.1:{args.port}/{{region}}",
+            'API_KEY': 'bench'
+        })
+        command = [sys.executable, os.path.abspath(__file__), '--child', str(size),
+                   '--port', str(args.port), '--new-games', str(args.new_games)]
+        output = subprocess.run(command, env=env, cwd=BACKEND_DIR, capture_output=True, text=True)
+        for line in output.stdout.splitlines():
+            if line.startswith('BENCH '):
+                return json.loads(line[len('BENCH '):])
+        sys.stderr.write(output.stderr[-4000:])
+        sys.exit(f"Benchmark for {size} players failed")
+
+
+def child(size, port, new_games):
+    """Runs inside the per-roster process, with the environment pointing at the stub."""
+    import logging
+    from sqlalchemy import event
+
+    import app as backend
+    from riot_api import riot_limiter
+
+    backend.scheduler.shutdown(wait=False)
+    logging.getLogger().setLevel(logging.WARNING)
+    backend.PREDEFINED_PLAYERS[:] = [{'summoner_name': f"bench_{i}", 'tagline': 'BENCH'} for i in range(size)]
+    stub_url = f"http://127.0.0.1:{port}/_stub"
+
+    queries = [0]
+    with backend.app.app_context():
+        backend.db.create_all()
+        backend.ingestion_lease.acquire()
+        event.listen(backend.db.engine, 'before_cursor_execute', lambda *a: queries.__setitem__(0, queries[0] + 1))
+
+    def cycle(name):
+        def stored_pairs():
+            with backend.app.app_context():
+                return set(backend.db.session.query(backend.Match.match_id, backend.Match.player_id).all())
+
+        with backend.app.app_context():
+            # Measure a full refresh: make every player due regardless of their polling schedule
+            backend.Player.query.update({backend.Player.next_poll_at: None})
+            backend.db.session.commit()
+        before = stored_pairs()
+        requests.post(f"{stub_url}/reset")
+        queries[0] = 0
+        slept = riot_limiter.slept_seconds
+
+        start = time.perf_counter()
+        backend.update_leaderboard_task()
+        wall = time.perf_counter() - start
+
+        db_queries = queries[0]
+        stats = requests.get(f"{stub_url}/stats").json()
+        # Evictions keep the row count flat, so count the pairs that are new
+        inserted = stored_pairs() - before
+        rows = len(inserted)
+        distinct = len({match_id for match_id, _ in inserted})
+        calls = sum(stats['calls'].values())
+        return {
+            'cycle': name,
+            'players': size,
+            'wall_seconds': round(wall, 2),
+            'riot_calls': calls,
+            'riot_429s': sum(stats['rejected'].values()),
+            'calls_by_method': stats['calls'],
+            'matches_ingested': distinct,
+            'rows_ingested': rows,
+            'calls_per_match': round(calls / distinct, 2) if distinct else None,
+            'limiter_sleep_seconds': round(riot_limiter.slept_seconds - slept, 2),
+            'db_queries': db_queries
+        }
+
+    results = [cycle('cold')]
+    requests.post(f"{stub_url}/advance", params={'games': new_games})
+    results.append(cycle('incremental'))
+    print('BENCH ' + json.dumps(results), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark leaderboard ingestion against riot_stub.py.")
+    parser.add_argument('--sizes', default='15,150,1500', help="Comma-separated roster sizes")
+    parser.add_argument('--port', type=int, default=5050)
+    parser.add_argument('--history', type=int, default=10, help="Games every premade has already played")
+    parser.add_argument('--new-games', type=int, default=2, help="Games played between the two cycles")
+    parser.add_argument('--app-limit', default='500:10,30000:600', help="Stub application limit (production key by default)")
+    parser.add_argument('--method-limit', default='2000:10')
+    parser.add_argument('--latency', type=float, default=0.02, help="Seconds the stub adds to every response")
+    parser.add_argument('--jitter', type=float, default=0.02)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    parser.add_argument('--json', action='store_true', help="Print raw JSON instead of a table")
+    parser.add_argument('--child', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.port, args.new_games)
+        return
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    results = []
+    for size in sizes:
+        # A fresh stub per roster resets its game history and rate-limit windows
+        stub = start_stub(args, size)
+        try:
+            results.extend(run_roster(args, size))
+        finally:
+            stub.terminate()
+            stub.wait()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    header = f"{'players':>7} {'cycle':<12} {'wall s':>8} {'calls':>7} {'429s':>5} {'matches':>8} {'rows':>6} {'calls/match':>11} {'limiter s':>9} {'db queries':>10}"
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        calls_per_match = '-' if r['calls_per_match'] is None else f"{r['calls_per_match']:.2f}"
+        print(f"{r['players']:>7} {r['cycle']:<12} {r['wall_seconds']:>8.2f} {r['riot_calls']:>7} {r['riot_429s']:>5} "
+              f"{r['matches_ingested']:>8} {r['rows_ingested']:>6} {calls_per_match:>11} "
+              f"{r['limiter_sleep_seconds']:>9.2f} {r['db_queries']:>10}")
+
+
+if __name__ == '__main__':
+    main()
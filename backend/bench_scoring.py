@@ -0,0 +1,323 @@
+# bench_scoring.py
+"""
+Micro-benchmarks for the scoring hot path, checked against stored baselines.
+
+Covers calculate_scores, timed against reference_calculate_scores (the
+original scalar scorer, kept here unchanged with its own copies of the
+role mapping and weight tables as the yardstick),
+assign_roles_by_team_position, get_role_weights / get_support_weights,
+rank_to_numeric and calculate_most_played_role, on generated Match-V5
+payloads of realistic size (see riot_stub.synthetic_match).
+
+    python bench_scoring.py            # compare with bench_scoring_baselines.json
+    python bench_scoring.py --update   # record new baselines after an intended change
+
+Every benchmark reports the median of several rounds in microseconds per item.
+The reference scorer runs in the same interleaved rounds, and each timing is
+compared as a multiple of it, so the stored baselines carry over between
+machines. Exits with status 1 if any benchmark's cost relative to the
+reference grew by more than --tolerance, or if calculate_scores is slower
+than the reference scorer itself.
+"""
+
+import argparse
+import gc
+import json
+import math
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+from leaderboard import calculate_most_played_role
+from rank_utils import DIVISION_VALUES, TIER_VALUES, rank_to_numeric
+from riot_api import (
+    ROLE_WEIGHTS,
+    assign_roles_by_team_position,
+    calculate_scores,
+    get_role_weights,
+    get_support_weights
+)
+from riot_stub import CHAMPIONS, FIRST_GAME_MS, GAME_INTERVAL_MS, synthetic_match
+
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_scoring_baselines.json')
+
+
+def build_corpus(match_count):
+    matches = [
+        synthetic_match(f"EUN1_{i}", [f"bench-puuid-{i}-{slot}" for slot in range(5)],
+                        FIRST_GAME_MS + i * GAME_INTERVAL_MS, seed='bench-scoring')
+        for i in range(match_count)
+    ]
+    teams = []
+    for match_data in matches:
+        participants = match_data['info']['participants']
+        teams.append(([p for p in participants if p['teamId'] == 100], match_data))
+        teams.append(([p for p in participants if p['teamId'] == 200], match_data))
+
+    roles = list(ROLE_WEIGHTS)
+    ranks = [(tier, division) for tier in TIER_VALUES for division in DIVISION_VALUES] + [('UNRANKED', ''), ('gold', 'ii')]
+    windows = [
+        [SimpleNamespace(assigned_role=roles[(i + j * 3) % len(roles)]) for j in range(10)]
+        for i in range(match_count)
+    ]
+    return SimpleNamespace(matches=matches, teams=teams, roles=roles, ranks=ranks, windows=windows)
+
+
+# Frozen copies of riot_api's role mapping and weight tables as of the scalar
+# scorer, so tuning the live tables or helpers never moves the yardstick
+REFERENCE_POSITIONS = {'TOP': 'Top', 'JUNGLE': 'Jungle', 'MIDDLE': 'Mid', 'BOTTOM': 'ADC', 'UTILITY': 'Support'}
+REFERENCE_WEIGHTS = {
+    'Top': {'kills': 2.5, 'deaths': -2.5, 'assists': 0.5, 'csPerMin': 2, 'visionScore': 0.5, 'totalDamage': 2, 'killParticipation': 1, 'damageSelfMitigated': 1, 'damageDealtToTurrets': 1},
+    'Mid': {'kills': 2, 'deaths': -2, 'assists': 0.75, 'csPerMin': 1.5, 'visionScore': 0.75, 'totalDamage': 2, 'killParticipation': 2, 'damageSelfMitigated': 0.5, 'damageDealtToTurrets': 0.5},
+    'Jungle': {'kills': 1.5, 'deaths': -2, 'assists': 1.5, 'csPerMin': 1, 'visionScore': 1.5, 'totalDamage': 1.5, 'killParticipation': 2, 'damageSelfMitigated': 0.75, 'damageDealtToTurrets': 0.25},
+    'ADC': {'kills': 2.5, 'deaths': -3, 'assists': 0.5, 'csPerMin': 2, 'visionScore': 0.25, 'totalDamage': 2, 'killParticipation': 1.5, 'damageSelfMitigated': 0.25, 'damageDealtToTurrets': 1},
+    'Support': {'kills': 1, 'deaths': -1.5, 'assists': 3, 'csPerMin': 0.25, 'visionScore': 2, 'totalDamage': 1, 'killParticipation': 2, 'damageSelfMitigated': 0.5, 'damageDealtToTurrets': 0.25},
+    'Undefined': {'kills': 4, 'deaths': -2, 'assists': 2, 'csPerMin': 2, 'visionScore': 1, 'totalDamage': 3, 'killParticipation': 0, 'damageSelfMitigated': 0, 'damageDealtToTurrets': 0}
+}
+REFERENCE_AGGRESSIVE_SUPPORTS = {"Pyke", "Malphite", "Brand", "Senna", "Xerath", "Lux", "Vel'koz", "Camille",
+                                 "Pantheon", "Singed", "Hwei", "Teemo", "Shaco", "Swain"}
+REFERENCE_AGGRESSIVE_SUPPORT_WEIGHTS = {'kills': 2, 'deaths': -1.3, 'assists': 2, 'csPerMin': 0.25, 'visionScore': 2, 'totalDamage': 1.5, 'killParticipation': 1.5, 'damageSelfMitigated': 0.5, 'damageDealtToTurrets': 0.25}
+
+
+def reference_role_weights(role, champion_name):
+    if role == 'Support' and champion_name in REFERENCE_AGGRESSIVE_SUPPORTS:
+        return REFERENCE_AGGRESSIVE_SUPPORT_WEIGHTS
+    return REFERENCE_WEIGHTS.get(role, REFERENCE_WEIGHTS['Undefined'])
+
+
+def reference_calculate_scores(team_members, match_data):
+    """
+    The scalar scorer calculate_scores used to be, one math.erf call per
+    metric. Self-contained, so it stays the same yardstick whatever riot_api
+    does.
+    """
+    match_scores = []
+    for member in team_members:
+        role = member['assignedRole'] = REFERENCE_POSITIONS.get(member.get('teamPosition'), 'Undefined')
+        weights = reference_role_weights(role, member.get('championName', None))
+
+        kills = member.get('kills', 0)
+        deaths = member.get('deaths', 0)
+        assists = member.get('assists', 0)
+        cs = member.get('totalMinionsKilled', 0) + member.get('neutralMinionsKilled', 0)
+        vision_score = member.get('visionScore', 0)
+        total_damage = member.get('totalDamageDealtToChampions', 0)
+        kill_participation = member.get('challenges', {}).get('killParticipation', 0)
+        self_mitigated_damage = member.get('damageSelfMitigated', 0)
+        turret_damage = member.get('damageDealtToTurrets', 0)
+
+        game_duration = match_data['info'].get('gameDuration', 0) / 60
+        cs_per_min = cs / game_duration
+
+        base_score = (
+            weights['kills'] * math.erf(30 / (10 * game_duration) * kills) +
+            weights['deaths'] * math.erf(30 / (10 * game_duration) * deaths) +
+            weights['assists'] * math.erf(30 / (10 * game_duration) * assists) +
+            weights['csPerMin'] * math.erf(1 / 5 * cs_per_min) +
+            weights['visionScore'] * math.erf(30 / (50 * game_duration) * vision_score) +
+            weights['totalDamage'] * math.erf(30 / (30000 * game_duration) * total_damage) +
+            weights['killParticipation'] * kill_participation +
+            weights['damageSelfMitigated'] * math.erf(30 / (25000 * game_duration) * self_mitigated_damage) +
+            weights['damageDealtToTurrets'] * math.erf(turret_damage / 6000)
+        )
+        match_scores.append({
+            'summonerName': member.get('summonerName', 'Unknown'),
+            'role': role,
+            'score': round(base_score, 2),
+            'kills': kills,
+            'deaths': deaths,
+            'assists': assists,
+            'csPerMin': round(cs_per_min, 2),
+            'visionScore': vision_score,
+            'totalDamage': round(total_damage, 2),
+            'killParticipation': kill_participation,
+            'damageSelfMitigated': self_mitigated_damage,
+            'damageDealtToTurrets': turret_damage
+        })
+    return match_scores
+
+
+def bench_reference_scores(corpus):
+    def run():
+        for team_members, match_data in corpus.teams:
+            reference_calculate_scores(team_members, match_data)
+    return run, len(corpus.teams)
+
+
+def bench_calculate_scores(corpus):
+    def run():
+        for team_members, match_data in corpus.teams:
+            calculate_scores(team_members, match_data)
+    return run, len(corpus.teams)
+
+
+def bench_assign_roles(corpus):
+    def run():
+        for team_members, _ in corpus.teams:
+            assign_roles_by_team_position(team_members)
+    return run, len(corpus.teams)
+
+
+def bench_get_role_weights(corpus):
+    pairs = [(corpus.roles[i % len(corpus.roles)], CHAMPIONS[i % len(CHAMPIONS)]) for i in range(10000)]
+
+    def run():
+        for role, champion in pairs:
+            get_role_weights(role, champion)
+    return run, len(pairs)
+
+
+def bench_get_support_weights(corpus):
+    champions = [CHAMPIONS[i % len(CHAMPIONS)] for i in range(10000)]
+
+    def run():
+        for champion in champions:
+            get_support_weights(champion)
+    return run, len(champions)
+
+
+def bench_rank_to_numeric(corpus):
+    ranks = corpus.ranks * 200
+
+    def run():
+        for tier, division in ranks:
+            rank_to_numeric(tier, division)
+    return run, len(ranks)
+
+
+def bench_most_played_role(corpus):
+    def run():
+        for window in corpus.windows:
+            calculate_most_played_role(window)
+    return run, len(corpus.windows)
+
+
+BENCHMARKS = {
+    'reference_calculate_scores': (bench_reference_scores, None),
+    'calculate_scores': (bench_calculate_scores, None),
+    'assign_roles_by_team_position': (bench_assign_roles, None),
+    'get_role_weights': (bench_get_role_weights, None),
+    'get_support_weights': (bench_get_support_weights, None),
+    'rank_to_numeric': (bench_rank_to_numeric, None),
+    'calculate_most_played_role': (bench_most_played_role, None),
+}
+
+
+# Timed in every run; the other timings are compared as multiples of it
+REFERENCE = 'reference_calculate_scores'
+# Scorers that must not be slower than the reference
+SCORERS = ('calculate_scores',)
+
+
+class Benchmark:
+    """One benchmark, looped like timeit so a single timing lasts at least min_seconds."""
+
+    def __init__(self, factory, reset, corpus, min_seconds=0.05):
+        self.run, self.items = factory(corpus)
+        self.reset = reset
+        self.corpus = corpus
+        self.loops = 1
+        while self.time() < min_seconds:
+            self.loops *= 2
+
+    def time(self):
+        """Returns microseconds per item for one timing, with garbage collection off."""
+        elapsed = 0.0
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for _ in range(self.loops):
+                if self.reset:
+                    self.reset(self.corpus)
+                start = time.perf_counter()
+                self.run()
+                elapsed += time.perf_counter() - start
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        return elapsed / (self.loops * self.items) * 1e6
+
+
+def measure(names, corpus, repeat):
+    """
+    Times every benchmark in interleaved rounds and returns {name: median
+    us/item}. Interleaving spreads a noisy moment on the machine over all
+    benchmarks instead of ruining one of them, and the median ignores the
+    rounds it still lands in; a best-of timing rewards one lucky round.
+    """
+    benchmarks = {name: Benchmark(*BENCHMARKS[name], corpus) for name in names}
+    timings = {name: [] for name in names}
+    for _ in range(repeat):
+        for name, benchmark in benchmarks.items():
+            timings[name].append(benchmark.time())
+    return {name: statistics.median(values) for name, values in timings.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the scoring hot path against stored baselines.")
+    parser.add_argument('--matches', type=int, default=500, help="Generated matches in the corpus")
+    parser.add_argument('--repeat', type=int, default=9, help="Interleaved rounds; the median counts")
+    parser.add_argument('--tolerance', type=float, default=0.4, help="Allowed slowdown, 0.4 = 40%%")
+    parser.add_argument('--baselines', default=BASELINES_PATH)
+    parser.add_argument('--update', action='store_true', help="Write the measured timings as the new baselines")
+    parser.add_argument('--only', help="Comma-separated benchmark names")
+    args = parser.parse_args()
+
+    names = args.only.split(',') if args.only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        sys.exit(f"Unknown benchmarks: {', '.join(unknown)}")
+    if REFERENCE not in names:
+        names.insert(0, REFERENCE)
+
+    results = measure(names, build_corpus(args.matches), args.repeat)
+    relative = {name: us / results[REFERENCE] for name, us in results.items()}
+
+    if args.update:
+        baselines = {}
+        if os.path.exists(args.baselines):
+            with open(args.baselines) as f:
+                baselines = json.load(f)
+        for name, us in results.items():
+            baselines[name] = round(relative[name], 4)
+            print(f"{name:<32} {us:>10.3f} us/item {relative[name]:>9.4f}x reference")
+        with open(args.baselines, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Baselines written to {args.baselines}")
+        return
+
+    if not os.path.exists(args.baselines):
+        sys.exit(f"No baselines at {args.baselines}; run with --update first")
+    with open(args.baselines) as f:
+        baselines = json.load(f)
+
+    regressions = []
+    print(f"{'benchmark':<32} {'us/item':>10} {'x ref':>9} {'baseline':>9} {'change':>8}")
+    for name, us in results.items():
+        if name == REFERENCE:
+            print(f"{name:<32} {us:>10.3f} {1:>9.4f} {'-':>9} {'-':>8}")
+            continue
+        flags = []
+        baseline = baselines.get(name)
+        if baseline is None:
+            change = 'new'
+        else:
+            change = f"{relative[name] / baseline - 1:+.1%}"
+            if relative[name] / baseline - 1 > args.tolerance:
+                flags.append('REGRESSION')
+        # A scorer must never cost more than the loop it replaced, whatever the baselines say
+        if name in SCORERS and relative[name] - 1 > args.tolerance:
+            flags.append('SLOWER THAN REFERENCE')
+        baseline_text = '-' if baseline is None else f"{baseline:.4f}"
+        print(f"{name:<32} {us:>10.3f} {relative[name]:>9.4f} {baseline_text:>9} {change:>8}  {' '.join(flags)}".rstrip())
+        if flags:
+            regressions.append(name)
+
+    if regressions:
+        sys.exit(f"Slower than allowed by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+# leaderboard.py
+
+from datetime import timedelta
+
+# Number of recent matches a player's leaderboard stats are computed over
+MATCH_WINDOW = 10
+# Number of players published on the leaderboard
+LEADERBOARD_SIZE = 100
+# Number of published deltas kept so lagging clients can catch up without a full snapshot
+LEADERBOARD_DELTA_HISTORY = 20
+
+
+def calculate_most_played_role(matches):
+    """
+    Calculate the most played role based on roles stored in match data.
+    """
+    role_counts = {"Top": 0, "Jungle": 0, "Mid": 0, "ADC": 0, "Support": 0, "Undefined": 0}
+    for match in matches:
+        role = match.assigned_role
+        if role in role_counts:
+            role_counts[role] += 1
+
+    # Find the role with the highest count
+    most_played_role = max(role_counts, key=role_counts.get)
+    return most_played_role
+
+
+def _update_averages(player):
+    player.average_score = player.total_score / player.match_count if player.match_count > 0 else 0.0
+    if player.opponent_rank_count > 0:
+        player.average_opponent_rank = player.opponent_rank_sum / player.opponent_rank_count
+    else:
+        player.average_opponent_rank = None
+
+
+def apply_match_inserted(player, match):
+    """Folds a newly stored match into the player's running totals."""
+    # Scores have two decimals, so rounding keeps the running sum from drifting
+    player.total_score = round((player.total_score or 0.0) + match.score, 2)
+    player.match_count = (player.match_count or 0) + 1
+    if match.opponent_lane_rank is not None:
+        player.opponent_rank_sum = (player.opponent_rank_sum or 0) + match.opponent_lane_rank
+        player.opponent_rank_count = (player.opponent_rank_count or 0) + 1
+
+    if player.all_time_highest_score is None or match.score > player.all_time_highest_score:
+        player.all_time_highest_score = match.score
+    if player.all_time_lowest_score is None or match.score < player.all_time_lowest_score:
+        player.all_time_lowest_score = match.score
+
+    _update_averages(player)
+
+
+def apply_match_evicted(player, match):
+    """Removes an evicted match from the running totals (all-time high/low are kept)."""
+    player.total_score = round(player.total_score - match.score, 2)
+    player.match_count -= 1
+    if match.opponent_lane_rank is not None:
+        player.opponent_rank_sum -= match.opponent_lane_rank
+        player.opponent_rank_count -= 1
+
+    _update_averages(player)
+
+
+def update_window_fields(player, recent_matches):
+    """
+    Sets the fields that depend on which matches are in the window.
+
+    recent_matches: the player's stored matches, newest first, already trimmed
+    to MATCH_WINDOW.
+    """
+    player.tenth_game_score = recent_matches[-1].score if len(recent_matches) >= MATCH_WINDOW else None
+    player.most_played_role = calculate_most_played_role(recent_matches)
+
+
+def schedule_next_poll(player, found_new, now, min_interval, max_interval):
+    """
+    Sets when the player's match list is next checked. A new match resets the
+    gap to min_interval; every empty poll doubles it, up to max_interval and
+    never beyond the time since last_updated (their latest new match), so a
+    player between games of a session stays on a short leash.
+    """
+    if found_new or not player.poll_interval:
+        interval = min_interval
+    else:
+        idle = (now - player.last_updated).total_seconds() if player.last_updated else max_interval
+        interval = min(player.poll_interval * 2, max(idle, min_interval), max_interval)
+    player.poll_interval = int(interval)
+    player.next_poll_at = now + timedelta(seconds=interval)
+
+
+def reconcile_player(player, matches):
+    """
+    Recomputes every read model field from the player's stored matches.
+
+    The running totals cover every stored match, not just the newest
+    MATCH_WINDOW: rows beyond the window are still subtracted with
+    apply_match_evicted when the next refresh trims it, so they must have
+    been counted.
+    """
+    player.total_score = round(sum(m.score for m in matches), 2)
+    player.match_count = len(matches)
+    ranks = [m.opponent_lane_rank for m in matches if m.opponent_lane_rank is not None]
+    player.opponent_rank_sum = sum(ranks)
+    player.opponent_rank_count = len(ranks)
+    _update_averages(player)
+    update_window_fields(player, sorted(matches, key=lambda m: m.timestamp, reverse=True)[:MATCH_WINDOW])
+
+
+def leaderboard_row(player):
+    """Builds a player's leaderboard entry from the read model columns alone."""
+    return {
+        'summoner_name': player.summoner_name,
+        'tagline': player.tagline,
+        'average_score': player.average_score,
+        'last_updated': player.last_updated.isoformat(),
+        'highest_score': player.all_time_highest_score,
+        'lowest_score': player.all_time_lowest_score,
+        'tenth_game_score': player.tenth_game_score,
+        'most_played_role': player.most_played_role,
+        'average_opponent_rank': player.average_opponent_rank
+    }
+
+
+def rank_rows(rows):
+    """Orders leaderboard entries by average score and keeps the top LEADERBOARD_SIZE."""
+    return sorted(rows, key=lambda row: row['average_score'] or 0.0, reverse=True)[:LEADERBOARD_SIZE]
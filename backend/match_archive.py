@@ -0,0 +1,304 @@
+# match_archive.py
+"""
+Append-only columnar archive for matches evicted from the hot matches table.
+
+Rows are partitioned by the month they were played in. A month holds
+immutable segments, one directory per write with one .npy file per column,
+so readers memory-map exactly the columns they need and writers never touch
+existing files. A segment is written to a temporary directory and renamed
+into place, so a half-written segment is never visible. Writers on the host
+are serialized by a lock file; appends skip (match_id, player_id) pairs the
+month already holds, so evicting the same match twice (e.g. after a
+backfill) archives it once. compact() merges a month's segments into one;
+an append compacts its month once it holds more than max_segments, and
+compact_past_months() (run daily by the app) closes out finished months,
+so readers and the append dedupe only ever map a handful of segments.
+The lock is taken without blocking and retried after a short sleep, which
+gevent turns into a yield, so a long compaction never freezes the app.
+
+    from match_archive import match_archive
+    match_archive.aggregate('assigned_role', start=datetime(2024, 1, 1))
+"""
+
+import logging
+import os
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+
+import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# How long a writer waits before trying a held lock again
+LOCK_RETRY_INTERVAL = 0.05
+
+ROLES = ['Top', 'Jungle', 'Mid', 'ADC', 'Support', 'Undefined']
+ROLE_CODES = {role: code for code, role in enumerate(ROLES)}
+
+# Column name -> dtype; opponent_lane_rank uses -1 for unknown
+COLUMNS = {
+    'match_id': 'S32',
+    'player_id': np.int32,
+    'timestamp': np.int64,  # Epoch seconds
+    'score': np.float64,
+    'kills': np.int16,
+    'deaths': np.int16,
+    'assists': np.int16,
+    'cs': np.int32,
+    'assigned_role': np.int8,  # Index into ROLES
+    'opponent_lane_rank': np.int16,
+    'game_duration': np.float32  # Minutes
+}
+GROUP_BY = ('player_id', 'assigned_role')
+
+
+def _month(timestamp):
+    return datetime.fromtimestamp(int(timestamp)).strftime('%Y-%m')
+
+
+def _to_columns(matches):
+    """Converts Match objects into column arrays."""
+    return {
+        'match_id': np.array([m.match_id.encode('utf-8') for m in matches], dtype=COLUMNS['match_id']),
+        'player_id': np.array([m.player_id for m in matches], dtype=COLUMNS['player_id']),
+        'timestamp': np.array([int(m.timestamp.timestamp()) for m in matches], dtype=COLUMNS['timestamp']),
+        'score': np.array([m.score for m in matches], dtype=COLUMNS['score']),
+        'kills': np.array([m.kills for m in matches], dtype=COLUMNS['kills']),
+        'deaths': np.array([m.deaths for m in matches], dtype=COLUMNS['deaths']),
+        'assists': np.array([m.assists for m in matches], dtype=COLUMNS['assists']),
+        'cs': np.array([m.cs for m in matches], dtype=COLUMNS['cs']),
+        'assigned_role': np.array([ROLE_CODES.get(m.assigned_role, ROLE_CODES['Undefined']) for m in matches],
+                                  dtype=COLUMNS['assigned_role']),
+        'opponent_lane_rank': np.array([-1 if m.opponent_lane_rank is None else m.opponent_lane_rank for m in matches],
+                                       dtype=COLUMNS['opponent_lane_rank']),
+        'game_duration': np.array([m.game_duration or 0.0 for m in matches], dtype=COLUMNS['game_duration'])
+    }
+
+
+def _keys(columns):
+    return np.char.add(np.char.add(columns['match_id'], b'/'), columns['player_id'].astype('S10'))
+
+
+def _take(columns, mask):
+    return {name: values[mask] for name, values in columns.items()}
+
+
+def _try_lock(lock_file):
+    """Takes an exclusive lock on the open lock file if it is free. Returns whether it did."""
+    try:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _unlock(lock_file):
+    if fcntl:
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+    else:
+        lock_file.seek(0)
+        msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class MatchArchive:
+    def __init__(self, path, max_segments=8):
+        self.path = path
+        self.max_segments = max_segments
+
+    @contextmanager
+    def _write_lock(self):
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, '.lock'), 'a') as lock_file:
+            while not _try_lock(lock_file):
+                time.sleep(LOCK_RETRY_INTERVAL)
+            try:
+                yield
+            finally:
+                _unlock(lock_file)
+
+    def months(self):
+        """Returns the archived months ('YYYY-MM'), oldest first."""
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(name for name in os.listdir(self.path) if len(name) == 7 and name[4] == '-')
+
+    def _segments(self, month):
+        month_dir = os.path.join(self.path, month)
+        if not os.path.isdir(month_dir):
+            return []
+        return sorted(os.path.join(month_dir, name) for name in os.listdir(month_dir) if not name.startswith('.'))
+
+    def _read_month(self, month, columns):
+        """Memory-maps the given columns of every segment in the month."""
+        for attempt in range(3):
+            try:
+                return [
+                    {name: np.load(os.path.join(segment, f"{name}.npy"), mmap_mode='r') for name in columns}
+                    for segment in self._segments(month)
+                ]
+            except FileNotFoundError:
+                # A compaction replaced the month's segments while we listed them
+                if attempt == 2:
+                    raise
+
+    def _write_segment(self, month, columns):
+        month_dir = os.path.join(self.path, month)
+        os.makedirs(month_dir, exist_ok=True)
+        name = f"{int(time.time() * 1000):013d}-{uuid.uuid4().hex[:8]}"
+        tmp_dir = os.path.join(month_dir, f".tmp-{name}")
+        os.makedirs(tmp_dir)
+        for column, values in columns.items():
+            np.save(os.path.join(tmp_dir, f"{column}.npy"), values)
+        os.rename(tmp_dir, os.path.join(month_dir, name))
+
+    def append(self, matches):
+        """
+        Archives Match objects, skipping pairs already archived. Returns the
+        number of rows written. Errors propagate, so callers don't delete
+        rows that never made it into the archive.
+        """
+        if not matches:
+            return 0
+        columns = _to_columns(matches)
+        months = np.array([_month(ts) for ts in columns['timestamp']])
+        written = 0
+        with self._write_lock():
+            for month in np.unique(months):
+                batch = _take(columns, months == month)
+                keys = _keys(batch)
+                _, first = np.unique(keys, return_index=True)
+                keep = np.zeros(len(keys), dtype=bool)
+                keep[first] = True
+                for segment in self._read_month(month, ('match_id', 'player_id')):
+                    keep &= ~np.isin(keys, _keys(segment))
+                if keep.any():
+                    self._write_segment(month, _take(batch, keep))
+                    written += int(keep.sum())
+                if len(self._segments(month)) > self.max_segments:
+                    self._compact(month)
+        return written
+
+    def scan(self, columns=None, start=None, end=None, player_ids=None):
+        """
+        Yields one dict of column arrays per segment, limited to rows played in
+        [start, end) (datetimes) and to the given player IDs.
+        """
+        columns = list(columns or COLUMNS)
+        needed = set(columns) | ({'timestamp'} if start or end else set()) | ({'player_id'} if player_ids else set())
+        first = start.strftime('%Y-%m') if start else None
+        last = end.strftime('%Y-%m') if end else None
+        wanted = np.array(sorted(player_ids), dtype=COLUMNS['player_id']) if player_ids else None
+        for month in self.months():
+            if (first and month < first) or (last and month > last):
+                continue
+            for segment in self._read_month(month, needed):
+                mask = np.ones(len(segment[columns[0]]), dtype=bool)
+                if start:
+                    mask &= segment['timestamp'] >= int(start.timestamp())
+                if end:
+                    mask &= segment['timestamp'] < int(end.timestamp())
+                if wanted is not None:
+                    mask &= np.isin(segment['player_id'], wanted)
+                if mask.all():
+                    yield {name: segment[name] for name in columns}
+                elif mask.any():
+                    yield {name: segment[name][mask] for name in columns}
+
+    def load(self, columns=None, start=None, end=None, player_ids=None):
+        """Returns the matching rows as one dict of in-memory column arrays."""
+        columns = list(columns or COLUMNS)
+        parts = list(self.scan(columns, start, end, player_ids))
+        if not parts:
+            return {name: np.empty(0, dtype=COLUMNS[name]) for name in columns}
+        return {name: np.concatenate([part[name] for part in parts]) for name in columns}
+
+    def aggregate(self, by='player_id', start=None, end=None, player_ids=None):
+        """
+        Aggregates archived matches per player ('player_id') or per role
+        ('assigned_role'), streaming one segment at a time. Returns
+        {key: {'matches', 'average_score', 'min_score', 'max_score', 'kda',
+        'cs_per_min', 'average_opponent_rank'}}; role keys are role names.
+        """
+        if by not in GROUP_BY:
+            raise ValueError(f"Can only aggregate by {', '.join(GROUP_BY)}")
+        sums = {}
+        columns = [by, 'score', 'kills', 'deaths', 'assists', 'cs', 'game_duration', 'opponent_lane_rank']
+        for part in self.scan(columns, start, end, player_ids):
+            keys, inverse = np.unique(part[by], return_inverse=True)
+            ranked = part['opponent_lane_rank'] >= 0
+            totals = {
+                'matches': np.bincount(inverse),
+                'score': np.bincount(inverse, weights=part['score']),
+                'kills': np.bincount(inverse, weights=part['kills']),
+                'deaths': np.bincount(inverse, weights=part['deaths']),
+                'assists': np.bincount(inverse, weights=part['assists']),
+                'cs': np.bincount(inverse, weights=part['cs']),
+                'minutes': np.bincount(inverse, weights=part['game_duration']),
+                'rank_sum': np.bincount(inverse, weights=np.where(ranked, part['opponent_lane_rank'], 0)),
+                'rank_count': np.bincount(inverse, weights=ranked)
+            }
+            min_scores = np.full(len(keys), np.inf)
+            max_scores = np.full(len(keys), -np.inf)
+            np.minimum.at(min_scores, inverse, part['score'])
+            np.maximum.at(max_scores, inverse, part['score'])
+            for i, key in enumerate(keys.tolist()):
+                entry = sums.setdefault(key, dict.fromkeys(totals, 0.0) | {'min': np.inf, 'max': -np.inf})
+                for name, values in totals.items():
+                    entry[name] += float(values[i])
+                entry['min'] = min(entry['min'], float(min_scores[i]))
+                entry['max'] = max(entry['max'], float(max_scores[i]))
+
+        results = {}
+        for key, entry in sums.items():
+            label = ROLES[key] if by == 'assigned_role' else key
+            results[label] = {
+                'matches': int(entry['matches']),
+                'average_score': round(entry['score'] / entry['matches'], 2),
+                'min_score': float(entry['min']),
+                'max_score': float(entry['max']),
+                'kda': round((entry['kills'] + entry['assists']) / max(entry['deaths'], 1), 2),
+                'cs_per_min': round(entry['cs'] / entry['minutes'], 2) if entry['minutes'] else None,
+                'average_opponent_rank': round(entry['rank_sum'] / entry['rank_count'], 2) if entry['rank_count'] else None
+            }
+        return results
+
+    def compact(self, month):
+        """Merges a month's segments into one, oldest match first."""
+        with self._write_lock():
+            self._compact(month)
+
+    def compact_past_months(self):
+        """Compacts every month before the current one that still has several segments."""
+        current = datetime.now().strftime('%Y-%m')
+        with self._write_lock():
+            for month in self.months():
+                if month < current:
+                    self._compact(month)
+
+    def _compact(self, month):
+        """compact() for a caller that holds the write lock."""
+        segments = self._segments(month)
+        if len(segments) < 2:
+            return
+        parts = self._read_month(month, COLUMNS)
+        merged = {name: np.concatenate([part[name] for part in parts]) for name in COLUMNS}
+        self._write_segment(month, _take(merged, np.argsort(merged['timestamp'], kind='stable')))
+        for segment in segments:
+            shutil.rmtree(segment)
+        logging.info(f"[MatchArchive] Compacted {len(segments)} segments of {month}")
+
+
+match_archive = MatchArchive(settings.Config.MATCH_ARCHIVE_PATH, settings.Config.MATCH_ARCHIVE_MAX_SEGMENTS)
@@ -0,0 +1,157 @@
+# match_model.py
+
+import settings
+from riot_api import assign_roles_by_team_position, calculate_scores, get_match_data
+
+
+class Participant:
+    """
+    The fields we use from one Match-V5 participant, out of the ~150 Riot
+    sends. Slots keep it a fraction of the size of the decoded dict, and
+    get/[] make it read like that dict, so the scoring code takes either.
+    Fields missing from the payload stay unset and get() returns the default.
+    """
+
+    FIELDS = (
+        'puuid', 'summonerName', 'teamId', 'teamPosition', 'championName', 'win',
+        'kills', 'deaths', 'assists', 'totalMinionsKilled', 'neutralMinionsKilled', 'visionScore',
+        'totalDamageDealtToChampions', 'damageSelfMitigated', 'damageDealtToTurrets'
+    )
+    __slots__ = FIELDS + ('killParticipation', 'assignedRole')
+
+    def __init__(self, participant):
+        for field in self.FIELDS:
+            if field in participant:
+                setattr(self, field, participant[field])
+        challenges = participant.get('challenges')
+        if challenges and 'killParticipation' in challenges:
+            self.killParticipation = challenges['killParticipation']
+
+    def get(self, key, default=None):
+        if key == 'challenges':
+            return {'killParticipation': self.killParticipation} if hasattr(self, 'killParticipation') else default
+        return getattr(self, key, default)
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        # Only assign_roles_by_team_position writes, setting assignedRole
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return hasattr(self, key)
+
+
+class MatchProjection:
+    """
+    A Match-V5 payload reduced to what ingestion and search read. The raw
+    payload can be dropped as soon as this is built. Like Participant it
+    answers the payload's ['info'] / .get('metadata') lookups for the few
+    keys the scoring code uses.
+    """
+
+    __slots__ = ('match_id', 'queue_id', 'game_duration', 'game_end_timestamp', 'participants')
+
+    def __init__(self, match_data):
+        info = match_data['info']
+        self.match_id = match_data.get('metadata', {}).get('matchId')
+        self.queue_id = info.get('queueId')
+        self.game_duration = info.get('gameDuration', 0)
+        self.game_end_timestamp = info.get('gameEndTimestamp')
+        self.participants = [Participant(participant) for participant in info['participants']]
+
+    def get(self, key, default=None):
+        if key == 'info':
+            return {'queueId': self.queue_id, 'gameDuration': self.game_duration,
+                    'gameEndTimestamp': self.game_end_timestamp}
+        if key == 'metadata':
+            return {'matchId': self.match_id}
+        return default
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+
+def load_match(match_id, region=settings.Config.DEFAULT_REGION):
+    """Fetches a match and returns it parsed from its projection, or None."""
+    match_data = get_match_data(match_id, region=region)
+    if not match_data:
+        return None
+    return ParsedMatch(MatchProjection(match_data))
+
+
+class ParsedMatch:
+    """
+    A Match-V5 payload parsed once for everything we do with it.
+
+    Takes the raw payload or a MatchProjection; either way only the
+    projection is kept. Every participant is role-mapped a single time and
+    indexed by PUUID and by (teamId, role), so finding a player's team or
+    lane opponent is a dict lookup. Scores and the other derived metrics
+    are computed for all ten participants in one calculate_scores call,
+    the first time any of them is asked for.
+    """
+
+    def __init__(self, match):
+        if not isinstance(match, MatchProjection):
+            match = MatchProjection(match)
+        self.match = match
+        self.match_id = match.match_id
+        self.queue_id = match.queue_id
+        self.game_duration = match.game_duration
+        self.game_end_timestamp = match.game_end_timestamp
+        self.participants = assign_roles_by_team_position(match.participants)
+
+        self.by_puuid = {}
+        self.by_team_role = {}
+        self.teams = {}
+        for participant in self.participants:
+            team_id = participant.get('teamId')
+            self.by_puuid[participant.get('puuid')] = participant
+            # Keep the first participant per slot, like the old linear search did
+            self.by_team_role.setdefault((team_id, participant['assignedRole']), participant)
+            self.teams.setdefault(team_id, []).append(participant)
+        self._metrics = None
+
+    def participant(self, puuid):
+        return self.by_puuid.get(puuid)
+
+    def team_of(self, puuid):
+        """Returns the participant's team in payload order, or None if they aren't in the match."""
+        participant = self.by_puuid.get(puuid)
+        if participant is None:
+            return None
+        return self.teams[participant.get('teamId')]
+
+    def lane_opponent(self, puuid):
+        """Returns the enemy participant playing the same role, or None."""
+        participant = self.by_puuid.get(puuid)
+        if participant is None or participant.get('teamId') is None:
+            return None
+        for team_id in self.teams:
+            if team_id != participant['teamId']:
+                opponent = self.by_team_role.get((team_id, participant['assignedRole']))
+                if opponent is not None:
+                    return opponent
+        return None
+
+    def metrics(self, puuid):
+        """Returns the participant's score dict as built by calculate_scores."""
+        if self._metrics is None:
+            scores = calculate_scores(self.participants, self.match)
+            self._metrics = {p.get('puuid'): score for p, score in zip(self.participants, scores)}
+        return self._metrics.get(puuid)
+
+    def team_metrics(self, puuid):
+        """Returns the score dicts of the participant's whole team, in payload order."""
+        team = self.team_of(puuid)
+        if team is None:
+            return None
+        return [self.metrics(member.get('puuid')) for member in team]
@@ -0,0 +1,163 @@
+# metrics.py
+"""
+Minimal in-process metrics rendered in the Prometheus text format.
+
+Counters, gauges and histograms are kept per process; every gunicorn worker
+serves its own /metrics, so scrape each of them (ingestion numbers only move
+on the worker holding the ingestion lease). Values that other modules already
+track, such as the match store's hit counts, are pulled in at scrape time
+with register_collector.
+"""
+
+import math
+import time
+from threading import Lock
+
+# Seconds; covers a cache hit through a Riot call stuck behind a 429
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_registry = []
+_collectors = []
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = Lock()
+        self._values = {}
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._samples(key, value))
+        return lines
+
+    def _samples(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][i] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+
+    def _samples(self, key, state):
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, state['counts']):
+            cumulative += count
+            labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+            samples.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        samples.append(f"{self.name}_sum{labels} {_format_value(state['sum'])}")
+        samples.append(f"{self.name}_count{labels} {state['count']}")
+        return samples
+
+
+class PhaseTimer:
+    """Records consecutive phases of one run into a histogram labelled by phase."""
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.started = time.perf_counter()
+
+    def end(self, phase):
+        now = time.perf_counter()
+        self.histogram.observe(now - self.started, phase=phase)
+        self.started = now
+
+
+def register_collector(func):
+    """
+    Registers a function called at scrape time. It returns
+    (name, kind, documentation, [(labels dict, value), ...]) tuples.
+    """
+    _collectors.append(func)
+    return func
+
+
+def render():
+    """Returns every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        for name, kind, documentation, samples in collector():
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {_format_value(value)}")
+    return '\n'.join(lines) + '\n'
+
+
+# Riot API
+riot_requests = Counter('riot_requests_total', 'Riot API responses by method and HTTP status.', ['method', 'status'])
+riot_request_duration = Histogram('riot_request_duration_seconds', 'Riot API request latency, excluding limiter waits.', ['method'])
+riot_rate_limited = Counter('riot_rate_limited_total', 'Riot API 429 responses by method and limit type.', ['method', 'limit_type'])
+riot_limiter_sleep = Counter('riot_limiter_sleep_seconds_total', 'Seconds spent sleeping in the rate limiter before a request.', ['method', 'priority'])
+
+# Leaderboard ingestion
+leaderboard_phase_duration = Histogram('leaderboard_phase_duration_seconds', 'Duration of each update_leaderboard phase.', ['phase'])
+leaderboard_matches_ingested = Counter('leaderboard_matches_ingested_total', 'Match rows stored by update_leaderboard.')
+leaderboard_last_cycle_matches = Gauge('leaderboard_last_cycle_matches_ingested', 'Match rows stored by the latest update_leaderboard run.')
+
+# Flask
+cache_requests = Counter('flask_cache_requests_total', 'Flask-Caching lookups by cache entry and result.', ['entry', 'result'])
+http_request_duration = Histogram('http_request_duration_seconds', 'Response time per route.', ['route', 'method', 'status'])
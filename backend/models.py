@@ -15,10 +15,23 @@ class Player(db.Model):
     all_time_lowest_score = db.Column(db.Float, nullable=True)  # Track all-time lowest score
     most_played_role = db.Column(db.String(20), default="Undefined")
 
+    # Leaderboard read model, maintained incrementally as matches come and go
+    match_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    opponent_rank_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    opponent_rank_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    average_opponent_rank = db.Column(db.Float, nullable=True)
+    tenth_game_score = db.Column(db.Float, nullable=True)
+
+    # Adaptive polling: when to next ask Riot for new matches, and the gap used
+    next_poll_at = db.Column(db.DateTime, nullable=True)  # None = due now
+    poll_interval = db.Column(db.Integer, nullable=True)  # Seconds
 
     # Relationship to Match model
     matches = db.relationship('Match', backref='player', lazy=True, cascade="all, delete-orphan")
 
+    # Riot ID lookups filter on (summoner_name, tagline)
+    __table_args__ = (db.Index('ix_players_summoner_name_tagline', 'summoner_name', 'tagline'),)
+
     def __init__(self, summoner_name, tagline='', puuid='', last_match_id=None):
         self.summoner_name = summoner_name
         self.tagline = tagline
@@ -30,6 +43,13 @@ class Player(db.Model):
         self.all_time_highest_score = 0.0
         self.all_time_lowest_score = None
         self.most_played_role = None
+        self.match_count = 0
+        self.opponent_rank_sum = 0
+        self.opponent_rank_count = 0
+        self.average_opponent_rank = None
+        self.tenth_game_score = None
+        self.next_poll_at = None
+        self.poll_interval = None
 
     def __repr__(self):
         return f'<Player {self.summoner_name}#{self.tagline}>'
@@ -53,7 +73,11 @@ class Match(db.Model):
 
 
 
-    __table_args__ = (db.UniqueConstraint('match_id', 'player_id', name='_match_player_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('match_id', 'player_id', name='_match_player_uc'),
+        # Per-player windows ordered by time; carrying score makes the recent-scores read index-only
+        db.Index('ix_matches_player_id_timestamp', 'player_id', 'timestamp', 'score'),
+    )
 
     def __init__(self, match_id, player_id, score, kills, deaths, assists, cs, timestamp, assigned_role, opponent_lane_rank, game_duration):
         self.match_id = match_id
@@ -70,4 +94,31 @@ class Match(db.Model):
 
 
     def __repr__(self):
-        return f'<Match {self.match_id} for Player ID {self.player_id}>'
\ No newline at end of file
+        return f'<Match {self.match_id} for Player ID {self.player_id}>'
+
+
+class SchedulerLease(db.Model):
+    """A named lease held by whichever process currently runs a scheduled job."""
+    __tablename__ = 'scheduler_leases'
+    name = db.Column(db.String(50), primary_key=True)
+    owner = db.Column(db.String(100), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<SchedulerLease {self.name} held by {self.owner} until {self.expires_at}>'
+
+
+class BackfillCheckpoint(db.Model):
+    """How far a named backfill has paged through one player's match history."""
+    __tablename__ = 'backfill_checkpoints'
+    name = db.Column(db.String(50), primary_key=True)
+    player_id = db.Column(db.Integer, db.ForeignKey('players.id', ondelete='CASCADE'), primary_key=True)
+    start_time = db.Column(db.Integer, nullable=True)  # Epoch seconds, None = from the first match
+    end_time = db.Column(db.Integer, nullable=False)  # Fixed when the backfill starts so page offsets stay put
+    next_start = db.Column(db.Integer, nullable=False, default=0)  # Offset of the next page of match IDs
+    matches_stored = db.Column(db.Integer, nullable=False, default=0)  # Rows stored by its pages, teammates' included
+    completed_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<BackfillCheckpoint {self.name} for Player ID {self.player_id} at {self.next_start}>'
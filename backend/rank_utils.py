@@ -3,7 +3,8 @@
 import time
 import requests
 import logging
-from riot_api import rate_limited_request  # Reuse if you have this in riot_api.py
+from riot_api import rate_limited_request, riot_url  # Reuse if you have this in riot_api.py
+from riot_cache import MISSING, summoner_id_cache, rank_cache
 from settings import Config
 
 # Maps for converting tier/division to a single numeric
@@ -44,13 +45,23 @@ def get_summoner_id_by_puuid(puuid, region=Config.DEFAULT_REGION_CODE):
     """
     Summoner-V4 endpoint to convert from PUUID -> Summoner ID
     GET /lol/summoner/v4/summoners/by-puuid/{puuid}
+
+    The mapping never changes, so it is cached permanently.
     """
-    url = f"https://{region}.api.riotgames.com/lol/summoner/v4/summoners/by-puuid/{puuid}"
+    cache_key = f"{region}:{puuid}"
+    cached = summoner_id_cache.get(cache_key)
+    if cached is not MISSING:
+        return cached
+
+    url = riot_url(region, f"/lol/summoner/v4/summoners/by-puuid/{puuid}")
     resp = rate_limited_request(url, params={})
     if not resp:
         return None
     data = resp.json()
-    return data.get('id')  # This is the Summoner ID used for League-V4 rank calls
+    summoner_id = data.get('id')  # This is the Summoner ID used for League-V4 rank calls
+    if summoner_id:
+        summoner_id_cache.set(cache_key, summoner_id)
+    return summoner_id
 
 
 def get_ranked_stats_by_summoner_id(summoner_id, region=Config.DEFAULT_REGION_CODE):
@@ -58,7 +69,7 @@ def get_ranked_stats_by_summoner_id(summoner_id, region=Config.DEFAULT_REGION_CO
     League-V4 endpoint to fetch rank data for a given Summoner ID
     GET /lol/league/v4/entries/by-summoner/{encryptedSummonerId}
     """
-    url = f"https://{region}.api.riotgames.com/lol/league/v4/entries/by-summoner/{summoner_id}"
+    url = riot_url(region, f"/lol/league/v4/entries/by-summoner/{summoner_id}")
     resp = rate_limited_request(url, params={})
     if not resp:
         return None
@@ -69,11 +80,26 @@ def fetch_flex_then_solo_rank_numeric(summoner_id, region=Config.DEFAULT_REGION)
     """
     Fetch the RANKED_FLEX_SR tier+division first. If not found, fallback to RANKED_SOLO_5x5.
     Return a numeric rank (or None if unranked in both).
+
+    Results, including unranked, are cached for Config.RANK_CACHE_TTL seconds;
+    failed fetches are not cached.
     """
+    cache_key = f"{region}:{summoner_id}"
+    cached = rank_cache.get(cache_key)
+    if cached is not MISSING:
+        return cached
+
     rank_entries = get_ranked_stats_by_summoner_id(summoner_id, region)
-    if not rank_entries:
+    if rank_entries is None:
         return None
 
+    numeric = numeric_rank_from_entries(rank_entries)
+    rank_cache.set(cache_key, numeric)
+    return numeric
+
+
+def numeric_rank_from_entries(rank_entries):
+    """Picks the flex rank, falling back to solo/duo, from League-V4 entries."""
     # 1) Try RANKED_FLEX_SR
     flex_entry = next((entry for entry in rank_entries if entry['queueType'] == 'RANKED_FLEX_SR'), None)
     if flex_entry:
@@ -2,8 +2,17 @@
 import settings
 import requests
 import math
+import re
 import time
 import logging
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from RateLimiter import RateLimiter, INGESTION
+from riot_cache import match_store, json_loads
+import metrics
 
 # Initialize logging
 logging.basicConfig(level=logging.INFO)
@@ -18,52 +27,117 @@ ROLE_WEIGHTS = {
     'Undefined': {'kills': 4, 'deaths': -2, 'assists': 2, 'csPerMin': 2, 'visionScore': 1,'totalDamage': 3, 'killParticipation': 0, 'damageSelfMitigated': 0, 'damageDealtToTurrets': 0}
 }
 
-AGGRESSIVE_SUPPORTS = ["Pyke","Malphite","Brand", "Senna","Xerath","Lux","Vel'koz","Camille","Pantheon","Singed","Hwei","Teemo","Shaco","Swain"]
-
-class RateLimiter:
-    def __init__(self, max_requests, period):
-        self.max_requests = max_requests  # Maximum requests allowed
-        self.period = period  # Time period in seconds
-        self.requests = []
-    
-    def wait(self):
-        current_time = time.time()
-        # Remove requests that are outside the period
-        self.requests = [req_time for req_time in self.requests if req_time > current_time - self.period]
-        if len(self.requests) >= self.max_requests:
-            # Calculate the time to wait
-            sleep_time = self.period - (current_time - self.requests[0])
-            print(f"Rate limit reached. Sleeping for {sleep_time:.2f} seconds.")
-            time.sleep(sleep_time)
-            # After sleeping, remove the oldest request
-            self.requests.pop(0)
-        # Record the new request
-        self.requests.append(time.time())
-
-# Initialize the rate limiters
-short_term_limiter = RateLimiter(max_requests=20, period=1)      # 20 requests per 1 second
-long_term_limiter = RateLimiter(max_requests=100, period=120)    # 100 requests per 120 seconds
+AGGRESSIVE_SUPPORTS = {"Pyke","Malphite","Brand", "Senna","Xerath","Lux","Vel'koz","Camille","Pantheon","Singed","Hwei","Teemo","Shaco","Swain"}
+AGGRESSIVE_SUPPORT_WEIGHTS = {'kills': 2, 'deaths': -1.3, 'assists': 2, 'csPerMin': 0.25, 'visionScore': 2,'totalDamage': 1.5, 'killParticipation': 1.5, 'damageSelfMitigated': 0.5, 'damageDealtToTurrets': 0.25}
+
+# Riot's documented development-key limits; real values are picked up from the
+# response headers after the first request
+riot_limiter = RateLimiter(app_limits=[(20, 1), (100, 120)], reserved_shares=settings.Config.RIOT_RESERVED_SHARES)
+
+# Priority of the Riot calls made by the current greenlet; see riot_priority
+_request_context = threading.local()
+
+# Path patterns used to key per-method limits
+METHOD_PATTERNS = [
+    (re.compile(r'/riot/account/v1/accounts/by-riot-id/'), 'account-v1.by-riot-id'),
+    (re.compile(r'/lol/match/v5/matches/by-puuid/[^/]+/ids$'), 'match-v5.ids-by-puuid'),
+    (re.compile(r'/lol/match/v5/matches/[^/]+$'), 'match-v5.match'),
+    (re.compile(r'/lol/summoner/v4/summoners/by-puuid/'), 'summoner-v4.by-puuid'),
+    (re.compile(r'/lol/league/v4/entries/by-summoner/'), 'league-v4.entries-by-summoner'),
+]
+
+def riot_url(region, path):
+    """Builds the URL of a Riot API path on the given regional or platform host."""
+    return settings.Config.RIOT_API_BASE_URL.format(region=region) + path
+
+def get_method_key(url):
+    """Maps a Riot URL to the method its rate limit is counted against, per region host."""
+    parts = urlsplit(url)
+    for pattern, name in METHOD_PATTERNS:
+        match = pattern.search(parts.path)
+        if match:
+            # Anything before the API path (e.g. the stub's /{region} prefix) identifies the host
+            return f"{parts.netloc}{parts.path[:match.start()]}:{name}"
+    return f"{parts.netloc}:{parts.path}"
+
+@contextmanager
+def riot_priority(priority):
+    """
+    Runs the enclosed Riot calls at the given priority class (INTERACTIVE,
+    INGESTION or BACKFILL). The setting is per greenlet, so workers spawned
+    on a pool must enter it themselves. Calls made outside of it count as
+    ingestion, so only code that knows a user is waiting gets ahead.
+    """
+    previous = getattr(_request_context, 'priority', None)
+    _request_context.priority = priority
+    try:
+        yield
+    finally:
+        _request_context.priority = previous
+
+def current_priority():
+    return getattr(_request_context, 'priority', None) or INGESTION
+
+def create_http_session():
+    """
+    Builds the shared keep-alive session used for every Riot call.
+
+    Each regional host gets its own connection pool so the platform (eun1) and
+    regional (europe) endpoints don't compete for sockets. Stale pooled
+    connections are retried at connect time only; HTTP-level retries stay in
+    rate_limited_request so they are counted by the limiter.
+    """
+    session = requests.Session()
+    # respect_retry_after_header=False stops urllib3 from swallowing 429s itself
+    retry = Retry(total=2, connect=2, read=0, status=0, backoff_factor=0.2, allowed_methods=frozenset(['GET']),
+                  respect_retry_after_header=False)
+    for host in settings.Config.RIOT_HTTP_HOSTS:
+        session.mount(riot_url(host, "/"), HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=settings.Config.RIOT_HTTP_POOL_SIZE,
+            max_retries=retry
+        ))
+    return session
+
+http_session = create_http_session()
+http_timeout = (settings.Config.RIOT_HTTP_CONNECT_TIMEOUT, settings.Config.RIOT_HTTP_READ_TIMEOUT)
 
 def rate_limited_request(url, params, retries=3):
     headers = {'X-Riot-Token': settings.Config.API_KEY}
+    method = get_method_key(url)
+    # Metrics are labelled by endpoint only; the host part would just multiply series
+    endpoint = method.rsplit(':', 1)[-1]
+    priority = current_priority()
     for attempt in range(retries):
         try:
             # Wait if necessary
-            short_term_limiter.wait()
-            long_term_limiter.wait()
+            metrics.riot_limiter_sleep.inc(riot_limiter.wait(method, priority), method=endpoint, priority=priority)
             # Make the request
-            response = requests.get(url, params=params, headers=headers)
+            start = time.perf_counter()
+            try:
+                response = http_session.get(url, params=params, headers=headers, timeout=http_timeout)
+            except requests.exceptions.RequestException:
+                metrics.riot_requests.inc(method=endpoint, status='error')
+                raise
+            finally:
+                metrics.riot_request_duration.observe(time.perf_counter() - start, method=endpoint)
+            metrics.riot_requests.inc(method=endpoint, status=response.status_code)
+            riot_limiter.update_from_headers(method, response.headers)
             response.raise_for_status()
             return response
         except requests.exceptions.HTTPError as e:
             if response.status_code == 429:
-                # Rate limit exceeded, wait and retry
+                # Rate limit exceeded; the limiter holds every caller back until Retry-After
                 retry_after = int(response.headers.get('Retry-After', 1))
-                print(f"Rate limit exceeded. Retrying after {retry_after} seconds.")
-                time.sleep(retry_after)
+                limit_type = response.headers.get('X-Rate-Limit-Type')
+                riot_limiter.block(method, retry_after, limit_type)
+                metrics.riot_rate_limited.inc(method=endpoint, limit_type=limit_type or 'unknown')
+                print(f"Rate limit exceeded ({limit_type or 'unknown'}). Retrying after {retry_after} seconds.")
             else:
                 print(f"HTTP error: {e}")
                 break
+        except requests.exceptions.Timeout as e:
+            print(f"Request timed out: {e}")
         except requests.exceptions.RequestException as e:
             print(f"Request exception: {e}")
             break
@@ -76,7 +150,7 @@ def get_summoner_info(summoner_name=None, summoner_tagline=None, region=settings
         summoner_tagline = input("Summoner tagline: ")
 
     params = {}
-    api_url = f"https://{region}.api.riotgames.com/riot/account/v1/accounts/by-riot-id/{summoner_name}/{summoner_tagline}"
+    api_url = riot_url(region, f"/riot/account/v1/accounts/by-riot-id/{summoner_name}/{summoner_tagline}")
 
     try:
         response = rate_limited_request(api_url, params)
@@ -87,13 +161,19 @@ def get_summoner_info(summoner_name=None, summoner_tagline=None, region=settings
         print(f'Issue getting summoner data from API: {e}')
         return None
 
-def get_match_ids_by_summoner_puuid(summoner_puuid, start=0, count=10, queue=440, region=settings.Config.DEFAULT_REGION):
+def get_match_ids_by_summoner_puuid(summoner_puuid, start=0, count=10, queue=440, region=settings.Config.DEFAULT_REGION,
+                                    start_time=None, end_time=None):
     params = {
         'start': start,
-        'count': count,
+        'count': count,  # Riot allows at most 100 per page
         'queue': queue  # Only fetch matches from queueId 440 (Flex Ranked 5v5)
     }
-    api_url = f"https://{region}.api.riotgames.com/lol/match/v5/matches/by-puuid/{summoner_puuid}/ids"
+    # Optional epoch-second bounds, e.g. to page through one season
+    if start_time is not None:
+        params['startTime'] = start_time
+    if end_time is not None:
+        params['endTime'] = end_time
+    api_url = riot_url(region, f"/lol/match/v5/matches/by-puuid/{summoner_puuid}/ids")
 
     try:
         response = rate_limited_request(api_url, params)
@@ -105,16 +185,8 @@ def get_match_ids_by_summoner_puuid(summoner_puuid, start=0, count=10, queue=440
         return None
 
 def did_player_win_match(summoner_puuid, match_id, region=settings.Config.DEFAULT_REGION):
-    params = {}
-    api_url = f"https://{region}.api.riotgames.com/lol/match/v5/matches/{match_id}"
-
-    try:
-        response = rate_limited_request(api_url, params)
-        if response is None:
-            return None
-        match_data = response.json()
-    except requests.exceptions.RequestException as e:
-        print(f'Issue getting match data from match ID from API: {e}')
+    match_data = get_match_data(match_id, region=region)
+    if match_data is None:
         return None
 
     if summoner_puuid in match_data['metadata']['participants']:
@@ -127,7 +199,7 @@ def did_player_win_match(summoner_puuid, match_id, region=settings.Config.DEFAUL
 
 def get_recent_match_id(puuid, region=settings.Config.DEFAULT_REGION):
     """Fetches the most recent match ID for the given PUUID."""
-    api_url = f"https://{region}.api.riotgames.com/lol/match/v5/matches/by-puuid/{puuid}/ids"
+    api_url = riot_url(region, f"/lol/match/v5/matches/by-puuid/{puuid}/ids")
     params = {
         'start': 0,
         'count': 1,
@@ -146,16 +218,8 @@ def get_recent_match_id(puuid, region=settings.Config.DEFAULT_REGION):
 
 def get_team_members(puuid, match_id, region=settings.Config.DEFAULT_REGION):
     """Gets all team members for the given match."""
-    api_url = f"https://{region}.api.riotgames.com/lol/match/v5/matches/{match_id}"
-    params = {}
-
-    try:
-        response = rate_limited_request(api_url, params)
-        if response is None:
-            return None
-        match_data = response.json()
-    except requests.exceptions.RequestException as e:
-        print(f'Issue fetching match details: {e}')
+    match_data = get_match_data(match_id, region=region)
+    if match_data is None:
         return None
 
     participants = match_data['info']['participants']
@@ -177,9 +241,9 @@ def get_team_members(puuid, match_id, region=settings.Config.DEFAULT_REGION):
 def get_support_weights(champion_name):
     """Adjust support weights dynamically based on champion playstyle."""
     if champion_name in AGGRESSIVE_SUPPORTS:
-        return {'kills': 2, 'deaths': -1.3, 'assists': 2, 'csPerMin': 0.25, 'visionScore': 2,'totalDamage': 1.5, 'killParticipation': 1.5, 'damageSelfMitigated': 0.5, 'damageDealtToTurrets': 0.25}
+        return AGGRESSIVE_SUPPORT_WEIGHTS
     else:
-        return {'kills': 1, 'deaths': -1.5, 'assists': 3, 'csPerMin': 0.25, 'visionScore': 2,'totalDamage': 1, 'killParticipation': 2, 'damageSelfMitigated': 0.5, 'damageDealtToTurrets': 0.25}
+        return ROLE_WEIGHTS['Support']
 
 def get_role_weights(role, champion_name=None):
     if role == 'Support' and champion_name:
@@ -214,12 +278,14 @@ def assign_roles_by_team_position(team_members):
 
 def calculate_scores(team_members, match_data):
     """Calculates individual scores for a team based on assigned roles."""
-    import math
     match_scores = []
 
     # Assign roles to team members using teamPosition
     team_members = assign_roles_by_team_position(team_members)
 
+    game_duration = match_data['info'].get('gameDuration', 0)
+    game_duration = game_duration/60
+
     for member in team_members:
         # Retrieve assigned role and weights
         role = member.get('assignedRole', 'Undefined')
@@ -237,21 +303,18 @@ def calculate_scores(team_members, match_data):
         self_mitigated_damage = member.get('damageSelfMitigated', 0)
         turret_damage = member.get('damageDealtToTurrets', 0)
 
-        game_duration = match_data['info'].get('gameDuration', 0)
-        game_duration = game_duration/60
         cs_per_min = cs/game_duration
 
         # Apply scaling to metrics
         scaled_kills = math.erf(30 / (10 * game_duration) * kills)
         scaled_deaths = math.erf(30 / (10 * game_duration) * deaths)
         scaled_assists = math.erf(30 / (10 * game_duration) * assists)
-        scaled_cs_min = math.erf(1 / 5 * cs_per_min) 
+        scaled_cs_min = math.erf(1 / 5 * cs_per_min)
         scaled_vision = math.erf(30 / (50 * game_duration) * vision_score)
         scaled_total_damage = math.erf(30 / (30000 * game_duration) * total_damage)
         scaled_self_mitigated_damage = math.erf(30/(25000 * game_duration) * self_mitigated_damage)
         scaled_turret_damage = math.erf(turret_damage/6000)
 
-
         # Calculate the score using role-specific weights
         base_score = (
             weights['kills'] * scaled_kills +
@@ -263,17 +326,13 @@ def calculate_scores(team_members, match_data):
             weights['killParticipation'] * kill_participation +
             weights['damageSelfMitigated'] * scaled_self_mitigated_damage +
             weights['damageDealtToTurrets'] * scaled_turret_damage
-
         )
 
-        # Round the score to 2 decimal places
-        rounded_score = round(base_score, 2)
-
         # Append the calculated score with details
         match_scores.append({
             'summonerName': member.get('summonerName', 'Unknown'),
             'role': role,
-            'score': rounded_score,
+            'score': round(base_score, 2),
             'kills': kills,
             'deaths': deaths,
             'assists': assists,
@@ -290,19 +349,26 @@ def calculate_scores(team_members, match_data):
 # New methods
 
 def get_match_data(match_id, region=settings.Config.DEFAULT_REGION):
-    """Fetches match data given a match ID."""
-    api_url = f"https://{region}.api.riotgames.com/lol/match/v5/matches/{match_id}"
+    """Fetches match data given a match ID, serving finished matches from the match store."""
+    match_data = match_store.get(match_id)
+    if match_data is not None:
+        return match_data
+
+    api_url = riot_url(region, f"/lol/match/v5/matches/{match_id}")
     params = {}
 
     try:
         response = rate_limited_request(api_url, params)
         if response is None:
             return None
-        return response.json()
-    except requests.exceptions.RequestException as e:
+        match_data = json_loads(response.content)
+    except (requests.exceptions.RequestException, ValueError) as e:
         print(f'Issue fetching match data: {e}')
         return None
 
+    match_store.put(match_id, match_data)
+    return match_data
+
 def get_player_stats_in_match(puuid, match_data, team_only=False):
     """Extracts player's performance stats from match data."""
     participants = match_data['info']['participants']
@@ -347,7 +413,7 @@ def get_player_aggregated_score(puuid, match_count=10, region=settings.Config.DE
         if not player_stats:
             continue  # Skip if player stats couldn't be found
 
-        scores = calculate_scores([player_stats])
+        scores = calculate_scores([player_stats], match_data)
         score = scores[0]['score']  # Extract the score from the result
 
         total_score += score
@@ -416,7 +482,7 @@ if __name__ == "__main__":
     team_members = get_player_stats_in_match(puuid, match_data, team_only=True)
 
     # Calculate scores
-    scores = calculate_scores(team_members)
+    scores = calculate_scores(team_members, match_data)
 
     # Identify the player with the lowest score
     scores_sorted = sorted(scores, key=lambda x: x['score'])
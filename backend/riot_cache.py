@@ -0,0 +1,342 @@
+# riot_cache.py
+
+import json
+import logging
+import os
+import sqlite3
+import time
+import zlib
+from threading import Event, Lock
+
+import settings
+
+try:
+    import orjson  # Parses Match-V5 payloads several times faster than json
+except ImportError:
+    orjson = None
+
+
+# Returned by LookupCache.get on a miss, since None is a valid cached value
+MISSING = object()
+
+
+def json_loads(data):
+    """Decodes JSON from bytes or str, with orjson when it is installed."""
+    return orjson.loads(data) if orjson else json.loads(data)
+
+
+def json_dumps(value):
+    """Encodes compact JSON as UTF-8 bytes, with orjson when it is installed."""
+    if orjson:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+
+class SqliteStore:
+    """Base for the small SQLite-backed caches shared by all workers on the host."""
+
+    schema = []
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = Lock()
+        self._ready = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        if not self._ready:
+            with self._lock:
+                if not self._ready:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    for statement in self.schema:
+                        conn.execute(statement)
+                    conn.commit()
+                    self._ready = True
+        return conn
+
+
+class MatchStore(SqliteStore):
+    """
+    Durable store for finished Match-V5 payloads, keyed by match ID.
+
+    Payloads are kept zlib-compressed in a small SQLite file so every worker
+    process on the host shares them and they survive restarts. When the total
+    compressed size goes over max_bytes the least recently read matches are
+    evicted. Any storage error is logged and treated as a miss, so the store
+    can never stop us from talking to Riot.
+    """
+
+    schema = [
+        "CREATE TABLE IF NOT EXISTS match_payloads ("
+        " match_id TEXT PRIMARY KEY,"
+        " payload BLOB NOT NULL,"
+        " size INTEGER NOT NULL,"
+        " last_access REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS ix_match_payloads_last_access ON match_payloads (last_access)"
+    ]
+
+    def __init__(self, path, max_bytes):
+        super().__init__(path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, match_id):
+        """Returns the stored match payload, or None on a miss."""
+        try:
+            conn = self._connect()
+            try:
+                row = conn.execute(
+                    "SELECT payload FROM match_payloads WHERE match_id = ?", (match_id,)
+                ).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return None
+                conn.execute(
+                    "UPDATE match_payloads SET last_access = ? WHERE match_id = ?",
+                    (time.time(), match_id)
+                )
+                conn.commit()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logging.warning(f"[MatchStore] Read failed for {match_id}: {e}")
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return json_loads(zlib.decompress(row[0]))
+
+    def put(self, match_id, match_data):
+        """Stores a finished match payload and evicts old entries if over budget."""
+        if not match_data.get('info', {}).get('gameEndTimestamp'):
+            # Only finished matches are immutable
+            return
+
+        payload = zlib.compress(json_dumps(match_data))
+        try:
+            conn = self._connect()
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO match_payloads (match_id, payload, size, last_access) "
+                    "VALUES (?, ?, ?, ?)",
+                    (match_id, payload, len(payload), time.time())
+                )
+                conn.commit()
+                self._evict(conn)
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logging.warning(f"[MatchStore] Write failed for {match_id}: {e}")
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM match_payloads").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        # Free down to 90% of the budget so we don't evict on every write
+        to_free = total - int(self.max_bytes * 0.9)
+        victims = []
+        for match_id, size in conn.execute(
+                "SELECT match_id, size FROM match_payloads ORDER BY last_access ASC"):
+            victims.append((match_id,))
+            to_free -= size
+            if to_free <= 0:
+                break
+
+        conn.executemany("DELETE FROM match_payloads WHERE match_id = ?", victims)
+        conn.commit()
+        self.evictions += len(victims)
+        logging.info(f"[MatchStore] Evicted {len(victims)} matches to stay under {self.max_bytes} bytes")
+
+    def stats(self):
+        """Returns hit/miss counters together with the current store size."""
+        entries, size = 0, 0
+        try:
+            conn = self._connect()
+            try:
+                entries, size = conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM match_payloads"
+                ).fetchone()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logging.warning(f"[MatchStore] Stats query failed: {e}")
+
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+            'evictions': self.evictions,
+            'entries': entries,
+            'bytes': size
+        }
+
+
+class LookupCache(SqliteStore):
+    """
+    Persistent key/value cache for small Riot lookups (Riot ID -> PUUID,
+    PUUID -> summoner ID, summoner ID -> rank). Entries live for ttl seconds, or forever when ttl is
+    None, and the least recently used ones are evicted past max_entries.
+    Values are stored as JSON, so None can be cached too; use MISSING to tell
+    a miss apart.
+    """
+
+    def __init__(self, path, name, ttl=None, max_entries=50000):
+        super().__init__(path)
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.schema = [
+            f"CREATE TABLE IF NOT EXISTS {name} ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL,"
+            " last_access REAL NOT NULL)",
+            f"CREATE INDEX IF NOT EXISTS ix_{name}_last_access ON {name} (last_access)"
+        ]
+
+    def get(self, key):
+        """Returns the cached value, or MISSING if absent or expired."""
+        now = time.time()
+        try:
+            conn = self._connect()
+            try:
+                row = conn.execute(
+                    f"SELECT value, expires_at FROM {self.name} WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None or (row[1] is not None and row[1] <= now):
+                    self.misses += 1
+                    return MISSING
+                conn.execute(f"UPDATE {self.name} SET last_access = ? WHERE key = ?", (now, key))
+                conn.commit()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logging.warning(f"[LookupCache:{self.name}] Read failed for {key}: {e}")
+            self.misses += 1
+            return MISSING
+
+        self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        now = time.time()
+        expires_at = now + self.ttl if self.ttl is not None else None
+        try:
+            conn = self._connect()
+            try:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO {self.name} (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), expires_at, now)
+                )
+                conn.commit()
+                self._evict(conn, now)
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logging.warning(f"[LookupCache:{self.name}] Write failed for {key}: {e}")
+
+    def _evict(self, conn, now):
+        count = conn.execute(f"SELECT COUNT(*) FROM {self.name}").fetchone()[0]
+        if count <= self.max_entries:
+            return
+
+        # Expired entries go first, then the least recently used down to 90%
+        removed = conn.execute(
+            f"DELETE FROM {self.name} WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)
+        ).rowcount
+        excess = count - removed - int(self.max_entries * 0.9)
+        if excess > 0:
+            removed += conn.execute(
+                f"DELETE FROM {self.name} WHERE key IN "
+                f"(SELECT key FROM {self.name} ORDER BY last_access ASC LIMIT ?)", (excess,)
+            ).rowcount
+        conn.commit()
+        self.evictions += removed
+
+    def stats(self):
+        entries = 0
+        try:
+            conn = self._connect()
+            try:
+                entries = conn.execute(f"SELECT COUNT(*) FROM {self.name}").fetchone()[0]
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logging.warning(f"[LookupCache:{self.name}] Stats query failed: {e}")
+
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+            'evictions': self.evictions,
+            'entries': entries
+        }
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls for the same key onto one execution. The first
+    caller runs the function; everyone arriving while it is in flight waits
+    and gets the same result (or exception). Nothing is kept afterwards, so
+    pair it with a cache for repeat calls.
+    """
+
+    class _Call:
+        def __init__(self):
+            self.done = Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._lock = Lock()
+        self._calls = {}
+        self.shared = 0
+
+    def do(self, key, func, *args):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+os.makedirs(os.path.dirname(settings.Config.MATCH_STORE_PATH) or '.', exist_ok=True)
+match_store = MatchStore(settings.Config.MATCH_STORE_PATH, settings.Config.MATCH_STORE_MAX_BYTES)
+
+# Opponent lookups: a PUUID's summoner ID never changes, ranks go stale
+os.makedirs(os.path.dirname(settings.Config.LOOKUP_CACHE_PATH) or '.', exist_ok=True)
+summoner_id_cache = LookupCache(settings.Config.LOOKUP_CACHE_PATH, 'summoner_ids',
+                                ttl=None, max_entries=settings.Config.LOOKUP_CACHE_MAX_ENTRIES)
+rank_cache = LookupCache(settings.Config.LOOKUP_CACHE_PATH, 'ranks',
+                         ttl=settings.Config.RANK_CACHE_TTL, max_entries=settings.Config.LOOKUP_CACHE_MAX_ENTRIES)
+
+# Searches: Riot ID -> PUUID, lowercased since Riot IDs are case-insensitive
+riot_id_cache = LookupCache(settings.Config.LOOKUP_CACHE_PATH, 'riot_ids',
+                            ttl=settings.Config.RIOT_ID_CACHE_TTL, max_entries=settings.Config.LOOKUP_CACHE_MAX_ENTRIES)
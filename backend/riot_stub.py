@@ -0,0 +1,295 @@
+# riot_stub.py
+"""
+Local stand-in for the Riot API, for load tests and benchmarks that must not
+spend the real API key.
+
+Serves the account-v1, match-v5, summoner-v4 and league-v4 endpoints we use
+under /{region}/..., so pointing RIOT_API_BASE_URL at
+http://127.0.0.1:5050/{region} sends every call here. Responses carry the
+X-App-Rate-Limit / X-Method-Rate-Limit headers and their counts, requests
+over a limit get a 429 with Retry-After, and latency can be added per call.
+
+Players are synthetic: bench_<n>#BENCH, who queue Flex in premades of five,
+each game against five random opponents. Recorded payloads can be served
+instead by pointing --fixtures at a directory of <match_id>.json files.
+
+    python riot_stub.py --port 5050 --players 1500 --latency 0.03
+
+POST /_stub/advance?games=N adds N new games to every premade's history, and
+GET /_stub/stats returns call counts per method plus the number of 429s.
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+
+from flask import Flask, jsonify, request
+
+POSITIONS = ['TOP', 'JUNGLE', 'MIDDLE', 'BOTTOM', 'UTILITY']
+CHAMPIONS = ['Garen', 'Darius', 'LeeSin', 'Vi', 'Ahri', 'Lux', 'Jinx', 'Caitlyn', 'Thresh', 'Pyke']
+TIERS = ['IRON', 'BRONZE', 'SILVER', 'GOLD', 'PLATINUM', 'EMERALD', 'DIAMOND']
+DIVISIONS = ['IV', 'III', 'II', 'I']
+PREMADE_SIZE = 5
+GAME_INTERVAL_MS = 35 * 60 * 1000
+FIRST_GAME_MS = 1700000000000
+
+METHODS = [
+    (re.compile(r'^/riot/account/v1/accounts/by-riot-id/([^/]+)/([^/]+)$'), 'account-v1.by-riot-id'),
+    (re.compile(r'^/lol/match/v5/matches/by-puuid/([^/]+)/ids$'), 'match-v5.ids-by-puuid'),
+    (re.compile(r'^/lol/match/v5/matches/([^/]+)$'), 'match-v5.match'),
+    (re.compile(r'^/lol/summoner/v4/summoners/by-puuid/([^/]+)$'), 'summoner-v4.by-puuid'),
+    (re.compile(r'^/lol/league/v4/entries/by-summoner/([^/]+)$'), 'league-v4.entries-by-summoner'),
+]
+
+
+def parse_limits(value):
+    return [tuple(int(x) for x in part.split(':')) for part in value.split(',') if part]
+
+
+def synthetic_match(match_id, members, end_timestamp, seed='riot-stub'):
+    """
+    Builds a deterministic Flex Match-V5 payload. members (PUUIDs, up to five)
+    fill the blue side; the other slots are random opponents.
+    """
+    rnd = random.Random(f"{seed}:{match_id}")
+    participants = []
+    for slot in range(10):
+        team_id = 100 if slot < 5 else 200
+        puuid = members[slot] if slot < len(members) else f"opponent-{match_id}-{slot}"
+        participants.append({
+            'puuid': puuid,
+            'summonerName': puuid,
+            'teamId': team_id,
+            'teamPosition': POSITIONS[slot % 5],
+            'championName': rnd.choice(CHAMPIONS),
+            'kills': rnd.randint(0, 15),
+            'deaths': rnd.randint(0, 12),
+            'assists': rnd.randint(0, 20),
+            'totalMinionsKilled': rnd.randint(0, 260),
+            'neutralMinionsKilled': rnd.randint(0, 60),
+            'visionScore': rnd.randint(0, 80),
+            'totalDamageDealtToChampions': rnd.randint(3000, 45000),
+            'damageSelfMitigated': rnd.randint(1000, 40000),
+            'damageDealtToTurrets': rnd.randint(0, 10000),
+            'challenges': {'killParticipation': round(rnd.random(), 3)},
+            'win': (team_id == 100) == (rnd.random() < 0.5)
+        })
+    return {
+        'metadata': {'matchId': match_id, 'participants': [p['puuid'] for p in participants]},
+        'info': {
+            'queueId': 440,
+            'gameDuration': rnd.randint(900, 2400),
+            'gameEndTimestamp': end_timestamp,
+            'participants': participants
+        }
+    }
+
+
+class FixedWindowLimit:
+    """Counts requests in fixed windows the way Riot does, e.g. 100 per 120 seconds."""
+
+    def __init__(self, limits):
+        self.limits = limits
+        self.windows = {period: [None, 0] for _, period in limits}
+
+    def hit(self, now):
+        """Records a request. Returns the seconds to wait if it was over a limit, else 0."""
+        retry_after = 0
+        for amount, period in self.limits:
+            window = self.windows[period]
+            if window[0] is None or now >= window[0] + period:
+                window[0], window[1] = now, 0
+            window[1] += 1
+            if window[1] > amount:
+                retry_after = max(retry_after, window[0] + period - now)
+        return retry_after
+
+    def header(self):
+        return ','.join(f"{amount}:{period}" for amount, period in self.limits)
+
+    def count_header(self):
+        return ','.join(f"{self.windows[period][1]}:{period}" for _, period in self.limits)
+
+
+class RiotStub:
+    def __init__(self, players, history, app_limits, method_limits, latency, jitter, fail_rate, fixtures, seed):
+        self.players = players
+        self.games = history
+        self.app_limits = app_limits
+        self.method_limits = method_limits
+        self.latency = latency
+        self.jitter = jitter
+        self.fail_rate = fail_rate
+        self.fixtures = fixtures
+        self.seed = seed
+        self.lock = threading.Lock()
+        self.app_limit = {}
+        self.method_limit = {}
+        self.calls = Counter()
+        self.rejected = Counter()
+
+    # Synthetic world
+
+    def player_index(self, puuid):
+        if not puuid.startswith('bench-puuid-'):
+            return None
+        index = int(puuid.rsplit('-', 1)[1])
+        return index if index < self.players else None
+
+    def match_ids(self, index):
+        """Match IDs of the player's premade, newest first."""
+        group = index // PREMADE_SIZE
+        return [f"EUN1_{group * 100000 + game}" for game in range(self.games - 1, -1, -1)]
+
+    def match(self, match_id):
+        if self.fixtures:
+            path = os.path.join(self.fixtures, f"{match_id}.json")
+            if os.path.exists(path):
+                with open(path) as f:
+                    return json.load(f)
+
+        group, game = divmod(int(match_id.split('_')[1]), 100000)
+        if game >= self.games or group * PREMADE_SIZE >= self.players:
+            return None
+        members = [f"bench-puuid-{i}" for i in range(group * PREMADE_SIZE, min((group + 1) * PREMADE_SIZE, self.players))]
+        return synthetic_match(match_id, members, FIRST_GAME_MS + game * GAME_INTERVAL_MS, self.seed)
+
+    def respond(self, method, args):
+        if method == 'account-v1.by-riot-id':
+            name, tagline = args
+            match = re.fullmatch(r'bench_(\d+)', name)
+            if not match or tagline != 'BENCH' or int(match.group(1)) >= self.players:
+                return None
+            return {'puuid': f"bench-puuid-{match.group(1)}", 'gameName': name, 'tagLine': tagline}
+
+        if method == 'match-v5.ids-by-puuid':
+            index = self.player_index(args[0])
+            if index is None:
+                return []
+            start = request.args.get('start', 0, type=int)
+            count = request.args.get('count', 20, type=int)
+            return self.match_ids(index)[start:start + count]
+
+        if method == 'match-v5.match':
+            return self.match(args[0])
+
+        if method == 'summoner-v4.by-puuid':
+            return {'id': f"summoner-{args[0]}", 'puuid': args[0]}
+
+        if method == 'league-v4.entries-by-summoner':
+            rnd = random.Random(f"{self.seed}:{args[0]}")
+            if rnd.random() < 0.1:
+                return []  # Unranked
+            queue = rnd.choice(['RANKED_FLEX_SR', 'RANKED_SOLO_5x5'])
+            return [{'queueType': queue, 'tier': rnd.choice(TIERS), 'rank': rnd.choice(DIVISIONS)}]
+
+    # Rate limiting
+
+    def admit(self, region, method):
+        """Applies the app and method limits. Returns (headers, limit_type or None, retry_after)."""
+        with self.lock:
+            now = time.monotonic()
+            app_limit = self.app_limit.setdefault(region, FixedWindowLimit(self.app_limits))
+            method_limit = self.method_limit.setdefault((region, method), FixedWindowLimit(self.method_limits))
+            app_wait = app_limit.hit(now)
+            method_wait = method_limit.hit(now)
+            self.calls[method] += 1
+            headers = {
+                'X-App-Rate-Limit': app_limit.header(),
+                'X-App-Rate-Limit-Count': app_limit.count_header(),
+                'X-Method-Rate-Limit': method_limit.header(),
+                'X-Method-Rate-Limit-Count': method_limit.count_header()
+            }
+            if app_wait or method_wait:
+                self.rejected[method] += 1
+                limit_type = 'application' if app_wait >= method_wait else 'method'
+                return headers, limit_type, max(app_wait, method_wait)
+            if self.fail_rate and random.random() < self.fail_rate:
+                # Riot's own backend occasionally sheds load without counting it against us
+                self.rejected[method] += 1
+                return headers, 'service', 1
+            return headers, None, 0
+
+
+def create_app(stub):
+    app = Flask(__name__)
+
+    @app.route('/<region>/<path:path>')
+    def riot(region, path):
+        path = '/' + path
+        for pattern, method in METHODS:
+            match = pattern.match(path)
+            if match:
+                break
+        else:
+            return jsonify({'status': {'message': 'Not found', 'status_code': 404}}), 404
+
+        if stub.latency or stub.jitter:
+            time.sleep(stub.latency + random.random() * stub.jitter)
+
+        headers, limit_type, retry_after = stub.admit(region.lower(), method)
+        if limit_type:
+            headers['X-Rate-Limit-Type'] = limit_type
+            headers['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+            return jsonify({'status': {'message': 'Rate limit exceeded', 'status_code': 429}}), 429, headers
+
+        body = stub.respond(method, match.groups())
+        if body is None:
+            return jsonify({'status': {'message': 'Data not found', 'status_code': 404}}), 404, headers
+        return jsonify(body), 200, headers
+
+    @app.route('/_stub/advance', methods=['POST'])
+    def advance():
+        stub.games += request.args.get('games', 1, type=int)
+        return jsonify({'games': stub.games})
+
+    @app.route('/_stub/stats')
+    def stats():
+        return jsonify({'calls': dict(stub.calls), 'rejected': dict(stub.rejected)})
+
+    @app.route('/_stub/reset', methods=['POST'])
+    def reset():
+        with stub.lock:
+            stub.calls.clear()
+            stub.rejected.clear()
+        return jsonify({'ok': True})
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a fake Riot API for offline benchmarks.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5050)
+    parser.add_argument('--players', type=int, default=15, help="Number of bench_<n>#BENCH accounts")
+    parser.add_argument('--history', type=int, default=10, help="Games already played by every premade")
+    parser.add_argument('--app-limit', default='20:1,100:120', help="Application limit, Riot header format")
+    parser.add_argument('--method-limit', default='2000:10', help="Limit per method and region")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Extra random latency, up to this many seconds")
+    parser.add_argument('--fail-rate', type=float, default=0.0, help="Share of requests answered with a service 429")
+    parser.add_argument('--fixtures', help="Directory of recorded <match_id>.json payloads to serve")
+    parser.add_argument('--seed', default='riot-stub')
+    args = parser.parse_args()
+
+    stub = RiotStub(
+        players=args.players,
+        history=args.history,
+        app_limits=parse_limits(args.app_limit),
+        method_limits=parse_limits(args.method_limit),
+        latency=args.latency,
+        jitter=args.jitter,
+        fail_rate=args.fail_rate,
+        fixtures=args.fixtures,
+        seed=args.seed
+    )
+    create_app(stub).run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
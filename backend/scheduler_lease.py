@@ -0,0 +1,123 @@
+# scheduler_lease.py
+
+import logging
+import os
+import socket
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import gevent
+from flask import current_app
+from sqlalchemy import insert, or_, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from database import db
+from models import SchedulerLease
+
+
+class Lease:
+    """
+    Database lease that elects a single runner for a scheduled job.
+
+    Every gunicorn worker (and any script that imports app) starts its own
+    scheduler, so each tick first tries to take the lease row with one
+    conditional UPDATE that only matches when the lease has expired or is
+    already ours. The holder renews it after every phase of a long run, and
+    from a heartbeat greenlet every ttl/3 seconds while the run waits on
+    Riot, and keeps it across ticks. If the holder dies, the lease lapses
+    after ttl seconds and the next worker to tick takes over.
+    """
+
+    def __init__(self, name, ttl):
+        self.name = name
+        self.ttl = ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def _take(self, executor, now):
+        table = SchedulerLease.__table__
+        result = executor.execute(
+            update(table)
+            .where(table.c.name == self.name)
+            .where(or_(table.c.owner == self.owner, table.c.expires_at < now))
+            .values(owner=self.owner, expires_at=now + timedelta(seconds=self.ttl))
+        )
+        return result.rowcount == 1
+
+    def acquire(self):
+        """Takes or renews the lease. Returns True if this process holds it."""
+        now = datetime.utcnow()
+        try:
+            with db.engine.begin() as conn:
+                if self._take(conn, now):
+                    return True
+            # No row matched: either someone else holds the lease or it was never created
+            with db.engine.begin() as conn:
+                conn.execute(insert(SchedulerLease.__table__).values(
+                    name=self.name, owner=self.owner, expires_at=now + timedelta(seconds=self.ttl)))
+            return True
+        except IntegrityError:
+            return False
+        except SQLAlchemyError as e:
+            logging.error(f"[Lease:{self.name}] Could not acquire lease: {e}")
+            return False
+
+    def keep_alive(self):
+        """
+        Renews the lease in a transaction of its own. Returns False if the
+        lease was lost to another process. A renewal that fails for any other
+        reason is only logged, since renew() still guards the commit.
+        """
+        try:
+            with db.engine.begin() as conn:
+                if self._take(conn, datetime.utcnow()):
+                    return True
+        except SQLAlchemyError as e:
+            logging.error(f"[Lease:{self.name}] Could not renew lease: {e}")
+            return True
+        logging.warning(f"[Lease:{self.name}] Lease lost to another process.")
+        return False
+
+    @contextmanager
+    def heartbeat(self):
+        """
+        Keeps the lease renewed while the block runs. Leave the block before
+        the caller's own write transaction, since on SQLite a renewal would
+        wait for that transaction's lock.
+        """
+        beat = gevent.spawn(self._beat, current_app._get_current_object())
+        try:
+            yield
+        finally:
+            beat.kill()
+
+    def _beat(self, app):
+        with app.app_context():
+            while True:
+                gevent.sleep(self.ttl / 3)
+                if not self.keep_alive():
+                    return
+
+    def renew(self, session):
+        """
+        Extends the lease inside the caller's transaction, so the renewal is
+        committed together with the work it guards. Returns False if the
+        lease was lost to another process.
+        """
+        if not self._take(session, datetime.utcnow()):
+            logging.warning(f"[Lease:{self.name}] Lease lost to another process.")
+            return False
+        return True
+
+    def release(self):
+        """Gives up the lease so another process can take over immediately."""
+        table = SchedulerLease.__table__
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(
+                    update(table)
+                    .where(table.c.name == self.name, table.c.owner == self.owner)
+                    .values(expires_at=datetime.utcnow())
+                )
+        except SQLAlchemyError as e:
+            logging.error(f"[Lease:{self.name}] Could not release lease: {e}")
@@ -1,6 +1,8 @@
 # config.py
 import os
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY')
     API_KEY = os.environ.get('API_KEY')
@@ -9,4 +11,58 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URI')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     BACKEND_URL = 'api.blackultras.com'
-
+    # Shared by every worker process: FileSystemCache on one host, RedisCache
+    # (set CACHE_TYPE and CACHE_REDIS_URL, needs the redis package) across hosts
+    CACHE_TYPE = os.environ.get('CACHE_TYPE', 'FileSystemCache')
+    CACHE_DIR = os.environ.get('CACHE_DIR', os.path.join(BASE_DIR, 'instance', 'flask_cache'))
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL')
+    CACHE_DEFAULT_TIMEOUT = 300  # Cache timeout set to 5 minutes
+    CACHE_THRESHOLD = 1000
+    # The published snapshots (leaderboard, stats, scores version) never expire
+    # and must not be pruned with the entries above, so FileSystemCache keeps
+    # them in a directory of their own with no threshold
+    SNAPSHOT_CACHE_DIR = os.environ.get('SNAPSHOT_CACHE_DIR', os.path.join(BASE_DIR, 'instance', 'flask_cache_snapshots'))
+    # Lets every worker broadcast Socket.IO events, e.g. redis://localhost:6379/0.
+    # Needed with more than one worker: without it a leaderboard delta only
+    # reaches clients connected to the worker holding the ingestion lease, and
+    # everyone else waits for their next version check (see PlayerProfile.js)
+    SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+    MATCH_STORE_PATH = os.environ.get('MATCH_STORE_PATH', os.path.join(BASE_DIR, 'instance', 'match_store.db'))
+    MATCH_STORE_MAX_BYTES = int(os.environ.get('MATCH_STORE_MAX_BYTES', 256 * 1024 * 1024))  # 256 MB compressed
+    # Matches evicted from the hot table are kept here, one directory per month
+    MATCH_ARCHIVE_PATH = os.environ.get('MATCH_ARCHIVE_PATH', os.path.join(BASE_DIR, 'instance', 'match_archive'))
+    # A month is compacted into one segment once an append leaves it with more than this
+    MATCH_ARCHIVE_MAX_SEGMENTS = int(os.environ.get('MATCH_ARCHIVE_MAX_SEGMENTS', 8))
+    LOOKUP_CACHE_PATH = os.environ.get('LOOKUP_CACHE_PATH', os.path.join(BASE_DIR, 'instance', 'lookup_cache.db'))
+    LOOKUP_CACHE_MAX_ENTRIES = int(os.environ.get('LOOKUP_CACHE_MAX_ENTRIES', 50000))
+    RANK_CACHE_TTL = int(os.environ.get('RANK_CACHE_TTL', 6 * 60 * 60))  # Seconds before an opponent's rank is refetched
+    # Riot IDs can be renamed and then claimed by someone else, so re-resolve them now and then
+    RIOT_ID_CACHE_TTL = int(os.environ.get('RIOT_ID_CACHE_TTL', 7 * 24 * 60 * 60))
+    SEARCH_RESULT_TTL = int(os.environ.get('SEARCH_RESULT_TTL', 60))  # Seconds a searched player's latest match is reused
+    # Each tracked player is polled on their own schedule: right after a new
+    # match every POLL_MIN_INTERVAL seconds, doubling on every empty poll up to
+    # POLL_MAX_INTERVAL, but never longer than they have been idle
+    POLL_TICK_SECONDS = int(os.environ.get('POLL_TICK_SECONDS', 30))  # How often due players are looked for
+    POLL_MIN_INTERVAL = int(os.environ.get('POLL_MIN_INTERVAL', 2 * 60))
+    POLL_MAX_INTERVAL = int(os.environ.get('POLL_MAX_INTERVAL', 2 * 60 * 60))
+    LEADERBOARD_REFRESH_CONCURRENCY = int(os.environ.get('LEADERBOARD_REFRESH_CONCURRENCY', 4))  # 1 = sequential
+    # Where Riot calls go; point it at riot_stub.py (e.g. http://127.0.0.1:5050/{region}) to run offline
+    RIOT_API_BASE_URL = os.environ.get('RIOT_API_BASE_URL', 'https://{region}.api.riotgames.com')
+    # Share of every Riot rate limit held back for each request class. Searches
+    # may borrow anything left; ingestion and backfill leave the others' shares alone
+    RIOT_RESERVED_SHARES = {
+        'interactive': float(os.environ.get('RIOT_INTERACTIVE_SHARE', 0.15)),
+        'ingestion': float(os.environ.get('RIOT_INGESTION_SHARE', 0.5)),
+        'backfill': float(os.environ.get('RIOT_BACKFILL_SHARE', 0.05))
+    }
+    RIOT_HTTP_HOSTS = ['europe', 'eun1']  # Regional and platform hosts we talk to
+    RIOT_HTTP_POOL_SIZE = int(os.environ.get('RIOT_HTTP_POOL_SIZE', 10))  # Keep-alive connections per host
+    RIOT_HTTP_CONNECT_TIMEOUT = float(os.environ.get('RIOT_HTTP_CONNECT_TIMEOUT', 3.05))
+    RIOT_HTTP_READ_TIMEOUT = float(os.environ.get('RIOT_HTTP_READ_TIMEOUT', 10))
+    # Only the process holding the ingestion lease runs the leaderboard job; if
+    # it dies, another worker takes over once the lease has expired
+    INGESTION_LEASE_TTL = int(os.environ.get('INGESTION_LEASE_TTL', 5 * 60))  # Seconds
+    # Bearer token Prometheus must send to scrape /metrics (authorization:
+    # credentials in the scrape config). Without one the endpoint is off, since
+    # it is served by the public app
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
@@ -1,11 +1,31 @@
-import React, { useEffect, useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import axios from 'axios';
 import './PlayerProfile.css'; // Ensure this is linked
 import { BACKEND_URL } from '../config';
+import { socket } from '../contexts/QueueContext';
+
+// How often we ask whether we are still on the latest leaderboard version.
+// Deltas are pushed as they are published, but a backend running several
+// workers without a Socket.IO message queue only pushes to some clients
+const VERSION_CHECK_MS = 60 * 1000;
+
+const playerKey = (row) => `${row.summoner_name}#${row.tagline}`;
+
+// Apply the changed rows of a leaderboard delta and re-rank, keeping the
+// number of rows the backend publishes
+const mergeRows = (rows, changed, size) => {
+  const byKey = new Map(rows.map((row) => [playerKey(row), row]));
+  changed.forEach((row) => byKey.set(playerKey(row), row));
+  return Array.from(byKey.values())
+    .sort((a, b) => b.average_score - a.average_score)
+    .slice(0, size);
+};
 
 function PlayerProfile() {
   const [leaderboardData, setLeaderboardData] = useState([]);
   const [loading, setLoading] = useState(true);
+  const versionRef = useRef(0);
+  const sizeRef = useRef(Infinity);
 
   const roleIcons = {
     Top: '/toplane-removebg-preview.png',
@@ -18,16 +38,48 @@ function PlayerProfile() {
 
   useEffect(() => {
     fetchLeaderboardData();
-    const interval = setInterval(() => {
-      fetchLeaderboardData();
-    }, 300000); // Refresh every 5 minutes
-    return () => clearInterval(interval);
+
+    // The backend pushes only the rows that changed; if we missed a version,
+    // ask it to resync us from the one we have
+    const handleDelta = (delta) => {
+      if (delta.base_version !== versionRef.current) {
+        socket.emit('leaderboard_resync', { version: versionRef.current });
+        return;
+      }
+      versionRef.current = delta.version;
+      setLeaderboardData((rows) => mergeRows(rows, delta.changed, sizeRef.current));
+    };
+
+    const handleSnapshot = (snapshot) => {
+      versionRef.current = snapshot.version;
+      sizeRef.current = snapshot.size;
+      setLeaderboardData(snapshot.leaderboard);
+    };
+
+    // Catch up on anything published while we were disconnected or that
+    // wasn't pushed to us; the backend only answers when we are behind
+    const checkVersion = () => {
+      socket.emit('leaderboard_resync', { version: versionRef.current });
+    };
+    const versionCheck = setInterval(checkVersion, VERSION_CHECK_MS);
+
+    socket.on('leaderboard_delta', handleDelta);
+    socket.on('leaderboard_snapshot', handleSnapshot);
+    socket.on('connect', checkVersion);
+    return () => {
+      clearInterval(versionCheck);
+      socket.off('leaderboard_delta', handleDelta);
+      socket.off('leaderboard_snapshot', handleSnapshot);
+      socket.off('connect', checkVersion);
+    };
   }, []);
 
   const fetchLeaderboardData = async () => {
     try {
       setLoading(true);
       const response = await axios.get(`${BACKEND_URL}/api/leaderboard`);
+      versionRef.current = response.data.version;
+      sizeRef.current = response.data.size;
       setLeaderboardData(response.data.leaderboard);
     } catch (error) {
       console.error('Error fetching leaderboard data:', error);
@@ -9,7 +9,8 @@ import { BACKEND_URL } from '../config'; // Import BACKEND_URL
 export const QueueContext = createContext();
 
 // Initialize Socket.IO client outside the component to ensure a single instance
-const socket = io(BACKEND_URL, {
+// (also used by PlayerProfile for leaderboard updates)
+export const socket = io(BACKEND_URL, {
   transports: ['websocket'], // Force WebSocket transport
   secure: true,              // Ensure secure connection over HTTPS
   reconnectionAttempts: 5,   // Number of reconnection attempts